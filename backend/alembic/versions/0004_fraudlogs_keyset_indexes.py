@@ -0,0 +1,36 @@
+"""add keyset pagination indexes on fraud_logs
+
+Revision ID: 0004_fraudlogs_keyset_indexes
+Revises: 0003_create_fraudlogs
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0004_fraudlogs_keyset_indexes'
+down_revision = '0003_create_fraudlogs'
+branch_labels = None
+depends_on = None
+
+
+# /alerts pages on (created_at DESC, id DESC); the action index serves the
+# dashboard's BLOCK/REVIEW/ALLOW filter without a sort.
+INDEXES = [
+    ('ix_fraud_logs_created_at_id', '(created_at DESC, id DESC)'),
+    ('ix_fraud_logs_action_created_at_id', '(suggested_action, created_at DESC, id DESC)'),
+    ('ix_fraud_logs_transaction_id', '(transaction_id)'),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY keeps fraud_logs writable while building on a large table;
+    # it cannot run inside the migration transaction.
+    with op.get_context().autocommit_block():
+        for name, columns in INDEXES:
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON fraud_logs {columns}')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _ in reversed(INDEXES):
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
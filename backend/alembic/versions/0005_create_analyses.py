@@ -0,0 +1,33 @@
+"""create analyses table for async wizard results
+
+Revision ID: 0005_create_analyses
+Revises: 0004_fraudlogs_keyset_indexes
+Create Date: 2026-10-17 00:10:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0005_create_analyses'
+down_revision = '0004_fraudlogs_keyset_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'analyses',
+        sa.Column('id', sa.Text(), primary_key=True, nullable=False),
+        sa.Column('transaction_id', sa.Text(), nullable=True),
+        sa.Column('status', sa.Text(), nullable=False),
+        sa.Column('envelope', sa.JSON(), nullable=False),
+        sa.Column('callback_url', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()')),
+        sa.Column('completed_at', sa.TIMESTAMP(timezone=True), nullable=True),
+    )
+    op.create_index('ix_analyses_transaction_id', 'analyses', ['transaction_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_analyses_transaction_id', table_name='analyses')
+    op.drop_table('analyses')
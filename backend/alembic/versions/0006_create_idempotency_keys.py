@@ -0,0 +1,32 @@
+"""create idempotency_keys table for /analyze retries
+
+Revision ID: 0006_create_idempotency_keys
+Revises: 0005_create_analyses
+Create Date: 2026-10-17 00:20:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0006_create_idempotency_keys'
+down_revision = '0005_create_analyses'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # the primary key is the unique index that makes a retried key a no-op
+    op.create_table(
+        'idempotency_keys',
+        sa.Column('key', sa.Text(), primary_key=True, nullable=False),
+        sa.Column('request_hash', sa.Text(), nullable=False),
+        sa.Column('response', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()')),
+    )
+    # TTL purge scans by age
+    op.create_index('ix_idempotency_keys_created_at', 'idempotency_keys', ['created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_idempotency_keys_created_at', table_name='idempotency_keys')
+    op.drop_table('idempotency_keys')
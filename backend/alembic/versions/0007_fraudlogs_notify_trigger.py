@@ -0,0 +1,47 @@
+"""notify fraud_logs inserts for the live alert stream
+
+Revision ID: 0007_fraudlogs_notify_trigger
+Revises: 0006_create_idempotency_keys
+Create Date: 2026-10-17 00:30:00
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '0007_fraudlogs_notify_trigger'
+down_revision = '0006_create_idempotency_keys'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # NOTIFY payloads are capped at 8000 bytes, so ai_reason is truncated;
+    # the full text stays in the row and is what /alerts returns.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION fraud_logs_notify() RETURNS trigger AS $$
+        BEGIN
+          PERFORM pg_notify('fraud_logs_new', json_build_object(
+            'id', NEW.id,
+            'transaction_id', NEW.transaction_id,
+            'risk_score', NEW.risk_score,
+            'ai_reason', left(NEW.ai_reason, 2000),
+            'suggested_action', NEW.suggested_action,
+            'created_at', NEW.created_at
+          )::text);
+          RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER fraud_logs_notify_insert
+        AFTER INSERT ON fraud_logs
+        FOR EACH ROW EXECUTE FUNCTION fraud_logs_notify()
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER IF EXISTS fraud_logs_notify_insert ON fraud_logs')
+    op.execute('DROP FUNCTION IF EXISTS fraud_logs_notify()')
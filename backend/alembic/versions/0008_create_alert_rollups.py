@@ -0,0 +1,43 @@
+"""create alert_rollups for /alerts/stats
+
+Revision ID: 0008_create_alert_rollups
+Revises: 0007_fraudlogs_notify_trigger
+Create Date: 2026-10-17 00:40:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0008_create_alert_rollups'
+down_revision = '0007_fraudlogs_notify_trigger'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'alert_rollups',
+        sa.Column('granularity', sa.Text(), nullable=False),  # minute | hour
+        sa.Column('bucket_start', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('dimension', sa.Text(), nullable=False),  # action | risk_level | rule
+        sa.Column('value', sa.Text(), nullable=False),
+        sa.Column('count', sa.BigInteger(), nullable=False, server_default='0'),
+        # the primary key is what the `count = count + delta` upsert conflicts on
+        sa.PrimaryKeyConstraint('granularity', 'bucket_start', 'dimension', 'value'),
+    )
+    # fraud_logs does not store risk level or rules, so only the action
+    # counters can be rebuilt from existing rows
+    for granularity in ('minute', 'hour'):
+        op.execute(
+            f"""
+            INSERT INTO alert_rollups(granularity, bucket_start, dimension, value, count)
+            SELECT '{granularity}', date_trunc('{granularity}', created_at), 'action', suggested_action, count(*)
+            FROM fraud_logs
+            WHERE suggested_action IS NOT NULL AND created_at IS NOT NULL
+            GROUP BY 2, 4
+            """
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('alert_rollups')
@@ -0,0 +1,221 @@
+"""monthly range partitions for fraud_logs and events
+
+Revision ID: 0009_partition_fraudlogs_events
+Revises: 0008_create_alert_rollups
+Create Date: 2026-10-17 00:50:00
+
+Each table is swapped for a table partitioned by month on created_at:
+
+1. The oldest row's month is read before any lock is taken. Then, under
+   an ACCESS EXCLUSIVE lock held only for catalog changes (nothing scans
+   a table while it is held), the heap table is renamed to
+   `<table>_legacy` and a partitioned table with the same columns takes
+   its name. It has partitions from that month through PREMAKE_MONTHS
+   ahead, plus a DEFAULT partition as a safety net. New writes land there
+   from now on.
+2. (autocommit) legacy rows are copied over in batches of BATCH_SIZE,
+   keyed on the legacy primary key (id), each batch its own transaction,
+   so locks stay short and the API keeps writing. Rows with a NULL
+   created_at are dated to the first partition's month as they are
+   copied. The legacy table is dropped once it is copied.
+
+The primary key becomes (id, created_at), because a partitioned table's
+unique keys must include the partition key. Re-running after an
+interruption is safe: the swap is skipped and the copy skips rows
+already present.
+
+Future partitions and retention are handled by
+`scripts/partition_maintenance.py`.
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0009_partition_fraudlogs_events'
+down_revision = '0008_create_alert_rollups'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+PREMAKE_MONTHS = 3
+
+# same definitions as 0004; on the partitioned parent they cascade to every partition
+FRAUD_LOGS_INDEXES = [
+    ('ix_fraud_logs_created_at_id', '(created_at DESC, id DESC)'),
+    ('ix_fraud_logs_action_created_at_id', '(suggested_action, created_at DESC, id DESC)'),
+    ('ix_fraud_logs_transaction_id', '(transaction_id)'),
+]
+
+# 0007's function, plus a switch so copied history is not pushed to the live stream
+NOTIFY_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION fraud_logs_notify() RETURNS trigger AS $$
+BEGIN
+  IF current_setting('ops_wizard.backfill', true) = 'on' THEN
+    RETURN NULL;
+  END IF;
+  PERFORM pg_notify('fraud_logs_new', json_build_object(
+    'id', NEW.id,
+    'transaction_id', NEW.transaction_id,
+    'risk_score', NEW.risk_score,
+    'ai_reason', left(NEW.ai_reason, 2000),
+    'suggested_action', NEW.suggested_action,
+    'created_at', NEW.created_at
+  )::text);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql
+"""
+
+NOTIFY_TRIGGER_SQL = (
+    'CREATE TRIGGER fraud_logs_notify_insert AFTER INSERT ON fraud_logs '
+    'FOR EACH ROW EXECUTE FUNCTION fraud_logs_notify()'
+)
+
+
+def _add_months(d: date, n: int) -> date:
+    m = d.month - 1 + n
+    return date(d.year + m // 12, m % 12 + 1, 1)
+
+
+def _relkind(bind, table: str):
+    return bind.execute(
+        sa.text("SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass(:t)"), {'t': table}
+    ).scalar()
+
+
+def _create_partitions(table: str, first: date, last: date) -> None:
+    month = first
+    while month <= last:
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE IF NOT EXISTS {table}_p{month:%Y_%m} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+    op.execute(f'CREATE TABLE IF NOT EXISTS {table}_pdefault PARTITION OF {table} DEFAULT')
+
+
+def _first_partition(bind, table: str) -> date:
+    # lowest monthly partition, named <table>_pYYYY_MM by _create_partitions
+    name = bind.execute(
+        sa.text(
+            "SELECT min(c.relname) FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(:t) AND c.relname ~ :pattern"
+        ),
+        {'t': table, 'pattern': f'^{table}_p[0-9]{{4}}_[0-9]{{2}}$'},
+    ).scalar()
+    if name is None:
+        today = date.today()
+        return date(today.year, today.month, 1)
+    year, month = name[-7:].split('_')
+    return date(int(year), int(month), 1)
+
+
+def _swap(table: str) -> None:
+    bind = op.get_bind()
+    if _relkind(bind, table) == 'p':
+        return  # already partitioned (re-run after an interrupted copy)
+
+    # read before the lock: this may scan the table, and writers keep going meanwhile.
+    # Rows older than this that arrive before the lock fall into the DEFAULT partition.
+    oldest = bind.execute(sa.text(f'SELECT min(created_at) FROM {table}')).scalar()
+    today = date.today()
+    first = date(oldest.year, oldest.month, 1) if oldest is not None else date(today.year, today.month, 1)
+
+    legacy = f'{table}_legacy'
+    op.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+    op.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+    op.execute(f'ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey')
+    if table == 'fraud_logs':
+        op.execute('DROP TRIGGER IF EXISTS fraud_logs_notify_insert ON fraud_logs_legacy')
+        for name, _ in FRAUD_LOGS_INDEXES:
+            op.execute(f'ALTER INDEX IF EXISTS {name} RENAME TO {name}_legacy')
+
+    op.execute(f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)')
+    op.execute(f'ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL')
+    op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id, created_at)')
+    _create_partitions(table, first, _add_months(date(today.year, today.month, 1), PREMAKE_MONTHS))
+    if table == 'fraud_logs':
+        for name, columns in FRAUD_LOGS_INDEXES:
+            op.execute(f'CREATE INDEX {name} ON fraud_logs {columns}')
+        op.execute(NOTIFY_FUNCTION_SQL)
+        op.execute(NOTIFY_TRIGGER_SQL)
+
+
+def _copy_legacy(table: str) -> None:
+    bind = op.get_bind()
+    legacy = f'{table}_legacy'
+    if _relkind(bind, legacy) is None:
+        return
+    columns = bind.execute(
+        sa.text(
+            "SELECT attname FROM pg_attribute WHERE attrelid = to_regclass(:t) "
+            "AND attnum > 0 AND NOT attisdropped ORDER BY attnum"
+        ),
+        {'t': legacy},
+    ).scalars().all()
+    # the partition key cannot be NULL; such rows are dated to the first month as they are copied
+    selected = ', '.join(
+        'coalesce(created_at, CAST(:first AS timestamptz))' if c == 'created_at' else c for c in columns
+    )
+    # keyset on id alone: the legacy primary key serves every batch as an index range scan
+    copy_batch = sa.text(
+        f"""
+        WITH batch AS (
+          SELECT * FROM {legacy}
+          WHERE id > CAST(:id AS text)
+          ORDER BY id
+          LIMIT :n
+        ), copied AS (
+          INSERT INTO {table} ({', '.join(columns)})
+          SELECT {selected} FROM batch ON CONFLICT DO NOTHING
+        )
+        SELECT max(id) FROM batch
+        """
+    )
+    first = _first_partition(bind, table).isoformat()
+    last = ''
+    while True:
+        last = bind.execute(copy_batch, {'id': last, 'first': first, 'n': BATCH_SIZE}).scalar()
+        if last is None:
+            break
+    op.execute(f'DROP TABLE {legacy}')
+
+
+def upgrade() -> None:
+    _swap('fraud_logs')
+    _swap('events')
+    # one transaction per batch: the API keeps writing while history is copied
+    with op.get_context().autocommit_block():
+        op.execute("SET ops_wizard.backfill = 'on'")
+        _copy_legacy('fraud_logs')
+        _copy_legacy('events')
+        op.execute('RESET ops_wizard.backfill')
+
+
+def _unpartition(table: str) -> None:
+    op.execute(f'ALTER TABLE {table} RENAME TO {table}_partitioned')
+    op.execute(f'ALTER TABLE {table}_partitioned RENAME CONSTRAINT {table}_pkey TO {table}_partitioned_pkey')
+    if table == 'fraud_logs':
+        op.execute('DROP TRIGGER IF EXISTS fraud_logs_notify_insert ON fraud_logs_partitioned')
+        for name, _ in FRAUD_LOGS_INDEXES:
+            op.execute(f'DROP INDEX IF EXISTS {name}')
+    op.execute(f'CREATE TABLE {table} (LIKE {table}_partitioned INCLUDING DEFAULTS)')
+    op.execute(f'ALTER TABLE {table} ALTER COLUMN created_at DROP NOT NULL')
+    # ids were only unique together with created_at; keep the newest copy
+    op.execute(
+        f'INSERT INTO {table} SELECT DISTINCT ON (id) * FROM {table}_partitioned ORDER BY id, created_at DESC'
+    )
+    op.execute(f'ALTER TABLE {table} ADD CONSTRAINT {table}_pkey PRIMARY KEY (id)')
+    op.execute(f'DROP TABLE {table}_partitioned')
+
+
+def downgrade() -> None:
+    _unpartition('events')
+    _unpartition('fraud_logs')
+    for name, columns in FRAUD_LOGS_INDEXES:
+        op.execute(f'CREATE INDEX {name} ON fraud_logs {columns}')
+    op.execute(NOTIFY_FUNCTION_SQL)
+    op.execute(NOTIFY_TRIGGER_SQL)
@@ -0,0 +1,35 @@
+"""create backfill_checkpoints for resumable rescoring
+
+Revision ID: 0010_create_backfill_checkpoints
+Revises: 0009_partition_fraudlogs_events
+Create Date: 2026-10-17 01:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0010_create_backfill_checkpoints'
+down_revision = '0009_partition_fraudlogs_events'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # one row per id range of a backfill job; last_id advances in the same
+    # transaction as the COPY that wrote the range's results
+    op.create_table(
+        'backfill_checkpoints',
+        sa.Column('job', sa.Text(), nullable=False),
+        sa.Column('range_start', sa.Text(), nullable=False),  # '' = from the first id
+        sa.Column('range_end', sa.Text(), nullable=True),  # NULL = through the last id
+        sa.Column('source', sa.Text(), nullable=False),
+        sa.Column('last_id', sa.Text(), nullable=True),
+        sa.Column('rows', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('done', sa.Boolean(), nullable=False, server_default=sa.text('false')),
+        sa.Column('updated_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()')),
+        sa.PrimaryKeyConstraint('job', 'range_start'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('backfill_checkpoints')
@@ -0,0 +1,54 @@
+"""create shadow_diffs and shadow_agreement for shadow scoring
+
+Revision ID: 0011_create_shadow_tables
+Revises: 0010_create_backfill_checkpoints
+Create Date: 2026-10-17 01:10:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0011_create_shadow_tables'
+down_revision = '0010_create_backfill_checkpoints'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # one row per transaction where a candidate's risk level or action differs
+    op.create_table(
+        'shadow_diffs',
+        sa.Column('id', sa.BigInteger(), sa.Identity(), primary_key=True),
+        sa.Column('candidate', sa.Text(), nullable=False),
+        sa.Column('transaction_id', sa.Text(), nullable=True),
+        sa.Column('primary_score', sa.Float(), nullable=True),
+        sa.Column('primary_risk_level', sa.Text(), nullable=True),
+        sa.Column('primary_action', sa.Text(), nullable=True),
+        sa.Column('shadow_score', sa.Float(), nullable=True),
+        sa.Column('shadow_risk_level', sa.Text(), nullable=True),
+        sa.Column('shadow_action', sa.Text(), nullable=True),
+        sa.Column('detail', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()')),
+    )
+    op.create_index('ix_shadow_diffs_candidate_created_at', 'shadow_diffs', ['candidate', sa.text('created_at DESC')])
+
+    # hourly totals per candidate, including the rows that agreed
+    op.create_table(
+        'shadow_agreement',
+        sa.Column('candidate', sa.Text(), nullable=False),
+        sa.Column('bucket_start', sa.TIMESTAMP(timezone=True), nullable=False),
+        sa.Column('compared', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('agreed', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('risk_level_changed', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('action_changed', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('escalated', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('relaxed', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('score_delta_sum', sa.Float(), nullable=False, server_default='0'),
+        sa.PrimaryKeyConstraint('candidate', 'bucket_start'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('shadow_agreement')
+    op.drop_index('ix_shadow_diffs_candidate_created_at', table_name='shadow_diffs')
+    op.drop_table('shadow_diffs')
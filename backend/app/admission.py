@@ -0,0 +1,133 @@
+"""Admission control for LLM work: bounded concurrency with a priority queue.
+
+`PriorityLimiter` hands out at most `max_concurrency` slots. Callers that
+do not get a slot wait in a bounded priority queue: lower number means
+more urgent, and FIFO order applies within a priority. A freed slot goes
+straight to the most urgent waiter. Nobody waits forever:
+
+- a waiter whose deadline passes is shed (`deadline`)
+- when the queue is full, a newcomer displaces the least urgent waiter if
+  it is more urgent (`displaced`), otherwise the newcomer is shed
+  (`queue_full`)
+
+Shed callers serve the deterministic wizard, so latency degrades
+gracefully instead of piling up outstanding requests.
+"""
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import heapq
+import itertools
+import time
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class PriorityLimiter:
+    def __init__(self, max_concurrency: int = 32, max_queue: int = 256):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self._in_use = 0
+        self._waiting = 0
+        # (priority, seq, future); entries whose future is done are stale
+        self._heap: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.admitted = 0
+        self.queued = 0
+        self.shed: Dict[str, int] = {}
+
+    def _shed(self, reason: str) -> AdmissionRejected:
+        self.shed[reason] = self.shed.get(reason, 0) + 1
+        return AdmissionRejected(reason)
+
+    def _displace(self, priority: int) -> bool:
+        """Shed the least urgent (newest among equals) waiter if it is less urgent than `priority`."""
+
+        victim = None
+        for entry in self._heap:
+            if entry[2].done():
+                continue
+            if victim is None or (entry[0], entry[1]) > (victim[0], victim[1]):
+                victim = entry
+        if victim is None or victim[0] <= priority:
+            return False
+        victim[2].set_exception(self._shed("displaced"))
+        self._waiting -= 1
+        return True
+
+    async def acquire(self, priority: int, deadline: Optional[float] = None) -> float:
+        """Wait for a slot; returns seconds waited or raises AdmissionRejected.
+
+        `deadline` is a `time.monotonic()` value.
+        """
+
+        if self._in_use < self.max_concurrency and not self._waiting:
+            self._in_use += 1
+            self.admitted += 1
+            return 0.0
+
+        started = time.monotonic()
+        if deadline is not None and deadline <= started:
+            raise self._shed("deadline")
+        if self._waiting >= self.max_queue and not self._displace(priority):
+            raise self._shed("queue_full")
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (priority, next(self._seq), fut))
+        self._waiting += 1
+        self.queued += 1
+        if len(self._heap) > 2 * self.max_queue + 16:
+            self._heap = [e for e in self._heap if not e[2].done()]
+            heapq.heapify(self._heap)
+
+        try:
+            timeout = None if deadline is None else deadline - started
+            await asyncio.wait((fut,), timeout=timeout)
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                self.release()  # slot was handed over just as we were cancelled
+            elif not fut.done():
+                fut.cancel()
+                self._waiting -= 1
+            raise
+        if not fut.done():
+            fut.cancel()
+            self._waiting -= 1
+            raise self._shed("deadline")
+        fut.result()  # re-raises AdmissionRejected("displaced")
+        self.admitted += 1
+        return time.monotonic() - started
+
+    def release(self) -> None:
+        while self._heap:
+            _, _, fut = heapq.heappop(self._heap)
+            if fut.done():
+                continue
+            # hand the slot straight to the most urgent waiter
+            self._waiting -= 1
+            fut.set_result(None)
+            return
+        self._in_use -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int, deadline: Optional[float] = None):
+        waited = await self.acquire(priority, deadline)
+        try:
+            yield waited
+        finally:
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_use": self._in_use,
+            "max_queue": self.max_queue,
+            "queue_depth": self._waiting,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed": dict(self.shed),
+        }
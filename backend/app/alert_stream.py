@@ -0,0 +1,191 @@
+"""Fan-out of new fraud_logs rows to live dashboard subscribers.
+
+`AlertBroadcaster.publish(alert)` is called once per new row. Where it is
+called from depends on the source: the in-process `analyze` path, or one
+shared Postgres LISTEN connection (`PgNotifyListener`) when several API
+processes write alerts. Each subscriber gets its own bounded queue. A
+client too slow to keep up does not hold back the others. When its buffer
+overflows, the queue is dropped and replaced by a single RESYNC marker,
+and the client reloads the list.
+
+Recent alerts are kept in a replay buffer ordered by the same
+`(created_at, id)` key the /alerts cursor uses. A reconnecting client
+sends its last cursor and gets what it missed from memory when the buffer
+still covers it (`replay_after`). Otherwise the caller falls back to the
+database.
+"""
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Callable, Deque, Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# queued in place of the dropped backlog when a subscriber falls behind
+RESYNC = object()
+
+AlertKey = Tuple[datetime, str]
+
+
+def alert_key(alert: Dict[str, Any]) -> AlertKey:
+    return alert["created_at"], alert["id"]
+
+
+class Subscription:
+    __slots__ = ("queue", "predicate", "lagged")
+
+    def __init__(self, maxsize: int, predicate: Optional[Callable[[Dict[str, Any]], bool]]):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.predicate = predicate
+        self.lagged = 0
+
+
+class AlertBroadcaster:
+    def __init__(self, client_buffer: int = 256, replay_size: int = 1000):
+        self.client_buffer = max(1, client_buffer)
+        self._replay: Deque[Dict[str, Any]] = deque(maxlen=max(1, replay_size))
+        # anything at or before this key may be missing from the replay buffer
+        self._floor: AlertKey = (datetime.now(timezone.utc), "")
+        self._subscribers: Set[Subscription] = set()
+        self.published = 0
+        self.dropped = 0
+
+    def publish(self, alert: Dict[str, Any]) -> None:
+        if len(self._replay) == self._replay.maxlen:
+            evicted = alert_key(self._replay[0])
+            if evicted > self._floor:
+                self._floor = evicted
+        self._replay.append(alert)
+        self.published += 1
+        for sub in self._subscribers:
+            if sub.predicate is not None and not sub.predicate(alert):
+                continue
+            try:
+                sub.queue.put_nowait(alert)
+            except asyncio.QueueFull:
+                # the client cannot keep up: drop its backlog, tell it to reload
+                while not sub.queue.empty():
+                    if sub.queue.get_nowait() is not RESYNC:
+                        self.dropped += 1
+                sub.queue.put_nowait(RESYNC)
+                sub.lagged += 1
+
+    def subscribe(self, predicate: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Subscription:
+        sub = Subscription(self.client_buffer, predicate)
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        self._subscribers.discard(sub)
+
+    def replay_after(
+        self, after: AlertKey, predicate: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Buffered alerts newer than `after`, or None if the buffer no longer covers it."""
+
+        if after < self._floor:
+            return None
+        missed = [
+            a for a in self._replay if alert_key(a) > after and (predicate is None or predicate(a))
+        ]
+        missed.sort(key=alert_key)
+        return missed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self._subscribers),
+            "published": self.published,
+            "dropped": self.dropped,
+            "lagged_subscribers": sum(1 for s in self._subscribers if s.lagged),
+            "replay_size": len(self._replay),
+        }
+
+
+def parse_notify_payload(payload: str) -> Dict[str, Any]:
+    """Decode a `fraud_logs_new` NOTIFY payload (see migration 0007)."""
+
+    alert = json.loads(payload)
+    created_at = datetime.fromisoformat(alert["created_at"])
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    alert["created_at"] = created_at
+    return alert
+
+
+class PgNotifyListener:
+    """One dedicated LISTEN connection; reconnects with backoff when it drops."""
+
+    def __init__(
+        self,
+        dsn: str,
+        channel: str,
+        on_alert: Callable[[Dict[str, Any]], None],
+        max_backoff: float = 30.0,
+    ):
+        self.dsn = dsn
+        self.channel = channel
+        self.on_alert = on_alert
+        self.max_backoff = max_backoff
+        self.connected = False
+        self.reconnects = 0
+        self.bad_payloads = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _on_notify(self, conn, pid, channel, payload) -> None:
+        try:
+            alert = parse_notify_payload(payload)
+        except Exception:
+            self.bad_payloads += 1
+            logger.warning("alert_stream: bad NOTIFY payload on %s", channel)
+            return
+        self.on_alert(alert)
+
+    async def _run(self) -> None:
+        backoff = 0.5
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn=self.dsn)
+                lost = asyncio.get_running_loop().create_future()
+                conn.add_termination_listener(lambda _c: lost.done() or lost.set_result(None))
+                await conn.add_listener(self.channel, self._on_notify)
+                self.connected = True
+                backoff = 0.5
+                await lost
+                logger.warning("alert_stream: LISTEN connection lost, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("alert_stream: LISTEN connect failed: %s", e)
+            finally:
+                self.connected = False
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            self.reconnects += 1
+            await asyncio.sleep(backoff)
+            backoff = min(self.max_backoff, backoff * 2)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "channel": self.channel,
+            "connected": self.connected,
+            "reconnects": self.reconnects,
+            "bad_payloads": self.bad_payloads,
+        }
@@ -0,0 +1,135 @@
+"""Keyset-paginated, filterable queries over `fraud_logs` for /alerts.
+
+Pages are ordered by `(created_at DESC, id DESC)`. The cursor is an opaque
+token that encodes the last row's `(created_at, id)`. The next page then
+starts with `(created_at, id) < (cursor)`, which the composite index from
+migration 0004 serves directly. No OFFSET scan and no full sort is needed,
+however deep the page.
+"""
+from datetime import datetime, timezone
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+import base64
+import json
+
+ALERT_COLUMNS = "id, transaction_id, risk_score, ai_reason, suggested_action, created_at"
+
+
+class AlertFilters(NamedTuple):
+    actions: Sequence[str] = ()
+    min_score: Optional[float] = None
+    max_score: Optional[float] = None
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    transaction_id: Optional[str] = None
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """Inverse of `encode_cursor`; raises ValueError on a malformed token."""
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return datetime.fromisoformat(created_at), str(row_id)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {e}") from e
+
+
+def _filter_clauses(filters: AlertFilters, arg) -> List[str]:
+    where: List[str] = []
+    if filters.actions:
+        where.append(f"suggested_action = ANY({arg(list(filters.actions))}::text[])")
+    if filters.min_score is not None:
+        where.append(f"risk_score >= {arg(filters.min_score)}")
+    if filters.max_score is not None:
+        where.append(f"risk_score <= {arg(filters.max_score)}")
+    if filters.since is not None:
+        where.append(f"created_at >= {arg(filters.since)}")
+    if filters.until is not None:
+        where.append(f"created_at < {arg(filters.until)}")
+    if filters.transaction_id:
+        where.append(f"transaction_id = {arg(filters.transaction_id)}")
+    return where
+
+
+def build_alerts_query(
+    filters: AlertFilters,
+    after: Optional[Tuple[datetime, str]] = None,
+    limit: Optional[int] = None,
+) -> Tuple[str, List[Any]]:
+    """Return (sql, args) selecting alerts newest first."""
+
+    args: List[Any] = []
+
+    def arg(value: Any) -> str:
+        args.append(value)
+        return f"${len(args)}"
+
+    where = _filter_clauses(filters, arg)
+    if after is not None:
+        where.append(f"(created_at, id) < ({arg(after[0])}, {arg(after[1])})")
+
+    sql = f"SELECT {ALERT_COLUMNS} FROM fraud_logs"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY created_at DESC, id DESC"
+    if limit is not None:
+        sql += f" LIMIT {arg(limit)}"
+    return sql, args
+
+
+def build_alerts_since_query(
+    filters: AlertFilters, since: Tuple[datetime, str], limit: int
+) -> Tuple[str, List[Any]]:
+    """Return (sql, args) for alerts newer than a cursor, oldest first (stream resume)."""
+
+    args: List[Any] = []
+
+    def arg(value: Any) -> str:
+        args.append(value)
+        return f"${len(args)}"
+
+    where = _filter_clauses(filters, arg)
+    where.append(f"(created_at, id) > ({arg(since[0])}, {arg(since[1])})")
+    sql = (
+        f"SELECT {ALERT_COLUMNS} FROM fraud_logs WHERE "
+        + " AND ".join(where)
+        + f" ORDER BY created_at, id LIMIT {arg(limit)}"
+    )
+    return sql, args
+
+
+def alert_to_json(row: Any) -> dict:
+    out = dict(row)
+    created_at = out.get("created_at")
+    if isinstance(created_at, datetime):
+        out["created_at"] = created_at.isoformat()
+    return out
+
+
+def _aware(value: datetime) -> datetime:
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def alert_matches(filters: AlertFilters, alert: dict) -> bool:
+    """In-process equivalent of the WHERE clause, for live stream events."""
+
+    if filters.actions and alert.get("suggested_action") not in filters.actions:
+        return False
+    score = alert.get("risk_score")
+    if filters.min_score is not None and (score is None or score < filters.min_score):
+        return False
+    if filters.max_score is not None and (score is None or score > filters.max_score):
+        return False
+    created_at = alert.get("created_at")
+    if filters.since is not None and created_at < _aware(filters.since):
+        return False
+    if filters.until is not None and created_at >= _aware(filters.until):
+        return False
+    if filters.transaction_id and alert.get("transaction_id") != filters.transaction_id:
+        return False
+    return True
@@ -0,0 +1,134 @@
+"""Deferred wizard generation: result store and background worker pool.
+
+In async mode /analyze answers with the scoring envelope right away. The
+n8n branch only needs score, risk_level and suggested_action to decide
+whether to block. Reasoning and wizard steps are generated later by a
+bounded pool of worker tasks. Finished envelopes are kept in a bounded
+in-memory store, where `GET /analysis/{id}`, the SSE stream and callback
+webhooks read them. They are also persisted by the caller-supplied job.
+"""
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class AnalysisRecord:
+    __slots__ = ("id", "status", "envelope", "created_at", "completed_at", "done")
+
+    def __init__(self, analysis_id: str, envelope: Dict[str, Any]):
+        self.id = analysis_id
+        self.status = PENDING
+        self.envelope = envelope
+        self.created_at = time.time()
+        self.completed_at: Optional[float] = None
+        self.done = asyncio.Event()
+
+
+class AnalysisStore:
+    """Bounded id -> record map; oldest finished records are evicted first."""
+
+    def __init__(self, max_records: int = 10000):
+        self.max_records = max_records
+        self._records: "OrderedDict[str, AnalysisRecord]" = OrderedDict()
+
+    def create(self, analysis_id: str, envelope: Dict[str, Any]) -> AnalysisRecord:
+        record = self._records[analysis_id] = AnalysisRecord(analysis_id, envelope)
+        self._evict()
+        return record
+
+    def get(self, analysis_id: str) -> Optional[AnalysisRecord]:
+        return self._records.get(analysis_id)
+
+    def finish(self, analysis_id: str, envelope: Dict[str, Any], status: str = COMPLETED) -> None:
+        record = self._records.get(analysis_id)
+        if record is None:
+            return
+        record.envelope = envelope
+        record.status = status
+        record.completed_at = time.time()
+        record.done.set()
+
+    def _evict(self) -> None:
+        if len(self._records) <= self.max_records:
+            return
+        for key in list(self._records):
+            if len(self._records) <= self.max_records:
+                break
+            if self._records[key].done.is_set():
+                del self._records[key]
+
+    def stats(self) -> Dict[str, Any]:
+        pending = sum(1 for r in self._records.values() if r.status == PENDING)
+        return {"records": len(self._records), "pending": pending, "max_records": self.max_records}
+
+
+Job = Callable[[], Awaitable[None]]
+
+
+class JobPool:
+    """N worker tasks draining a bounded queue of coroutine factories."""
+
+    def __init__(self, workers: int = 8, max_queue: int = 1000):
+        self.workers = workers
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=max_queue)
+        self._tasks: List[asyncio.Task] = []
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, job: Job) -> bool:
+        """Queue a job without waiting; False when the queue is full."""
+
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+        self.submitted += 1
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await job()
+                self.completed += 1
+            except Exception:
+                self.failed += 1
+                logger.exception("async wizard job failed")
+            finally:
+                self._queue.task_done()
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Let queued jobs finish (up to `timeout`), then cancel the workers."""
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("async wizard pool: %d jobs abandoned at shutdown", self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,203 @@
+"""Write-behind batched persistence for the `fraud_logs` audit trail.
+
+The audit row is not part of the /analyze answer, so the request path only
+drops it into a bounded in-memory queue and returns. A background task
+drains the queue and writes rows with one multi-row INSERT per batch
+(`unnest` over column arrays), flushing when a batch fills up or when the
+flush interval elapses, whichever comes first.
+
+Backpressure: the queue is bounded. When Postgres falls behind and the
+queue is full, new rows are dropped and counted instead of making callers
+wait. Failed flushes are retried with exponential backoff before the batch
+is counted as dropped.
+
+The writer is not tied to fraud_logs: any `INSERT ... SELECT * FROM
+unnest(...)` statement taking one array per column can be passed as `sql`.
+The idempotency keys use it this way.
+
+Anything derived from the rows (the /alerts/stats rollups, the local alert
+stream) hangs off `on_written`, which is called after a successful flush
+with only the rows the INSERT actually added. The statement reports them
+with `RETURNING id`, so retried duplicates and failed batches never count.
+Each row can carry a `context` value for that callback.
+"""
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+
+import asyncpg
+
+from app.metrics import timed_acquire
+
+logger = logging.getLogger(__name__)
+
+# (id, transaction_id, risk_score, ai_reason, suggested_action, created_at)
+# created_at is stamped at submit time so the live alert stream and the
+# stored row share one (created_at, id) cursor.
+FraudLogRow = Tuple[str, Optional[str], float, Optional[str], Optional[str], datetime]
+
+# fraud_logs is partitioned by month (migration 0009), so its primary key is
+# (id, created_at) and a retried row with a fresh created_at would not
+# conflict. Retries arrive within the idempotency TTL, so a row whose id was
+# written in the last two days is skipped (DISTINCT ON covers duplicates
+# within one batch); the bounded created_at range keeps that lookup on the
+# newest partitions.
+INSERT_FRAUD_LOGS_SQL = (
+    "INSERT INTO fraud_logs(id, transaction_id, risk_score, ai_reason, suggested_action, created_at) "
+    "SELECT DISTINCT ON (r.id) r.* FROM unnest($1::text[], $2::text[], $3::float8[], $4::text[], $5::text[], $6::timestamptz[]) "
+    "AS r(id, transaction_id, risk_score, ai_reason, suggested_action, created_at) "
+    "WHERE NOT EXISTS (SELECT 1 FROM fraud_logs f "
+    "WHERE f.id = r.id AND f.created_at > r.created_at - interval '2 days') "
+    "ON CONFLICT DO NOTHING "
+    "RETURNING id"
+)
+
+# (row, context passed to submit)
+Written = List[Tuple[FraudLogRow, Any]]
+
+
+class FraudLogWriter:
+    """Background batch writer for fraud_logs rows (or any unnest INSERT)."""
+
+    def __init__(
+        self,
+        pool: asyncpg.pool.Pool,
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.5,
+        max_retries: int = 3,
+        retry_backoff: float = 0.2,
+        sql: str = INSERT_FRAUD_LOGS_SQL,
+        component: str = "fraud_log_writer",
+        on_written: Optional[Callable[[Written], None]] = None,
+    ):
+        self.pool = pool
+        self.sql = sql
+        self.component = component
+        # needs a statement with `RETURNING id` (the row's first column)
+        self.on_written = on_written
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue: "asyncio.Queue[Tuple[FraudLogRow, Any]]" = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.enqueued = 0
+        self.written = 0
+        self.skipped = 0
+        self.dropped_full = 0
+        self.dropped_failed = 0
+        self.retries = 0
+        self.flushes = 0
+
+    def submit(self, row: FraudLogRow, context: Any = None) -> bool:
+        """Queue one row without waiting; returns False if it was dropped."""
+
+        if self._stopping:
+            self.dropped_full += 1
+            return False
+        try:
+            self._queue.put_nowait((row, context))
+        except asyncio.QueueFull:
+            self.dropped_full += 1
+            return False
+        self.enqueued += 1
+        return True
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Stop accepting rows and flush whatever is still queued."""
+
+        self._stopping = True
+        try:
+            if self._task is not None:
+                await asyncio.wait_for(self._task, timeout=timeout)
+            await asyncio.wait_for(self._drain(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%s: %d rows left unflushed at shutdown", self.component, self._queue.qsize())
+        finally:
+            self._task = None
+
+    async def _drain(self) -> None:
+        while not self._queue.empty():
+            await self._flush(self._take_batch())
+
+    def _take_batch(self, first: Optional[Tuple[FraudLogRow, Any]] = None) -> Written:
+        batch: Written = [] if first is None else [first]
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while not self._stopping:
+            try:
+                first = await asyncio.wait_for(self._queue.get(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                continue
+            # Give the batch up to flush_interval to fill before writing it.
+            deadline = loop.time() + self.flush_interval
+            while self._queue.qsize() < self.batch_size - 1 and not self._stopping:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                await asyncio.sleep(min(remaining, 0.01))
+            await self._flush(self._take_batch(first))
+
+    async def _flush(self, batch: Sequence[Tuple[FraudLogRow, Any]]) -> None:
+        if not batch:
+            return
+        rows = [row for row, _ in batch]
+        columns = [list(c) for c in zip(*rows)]
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with timed_acquire(self.pool, self.component) as conn:
+                    if self.on_written is None:
+                        await conn.execute(self.sql, *columns)
+                        inserted = None
+                    else:
+                        inserted = {r[0] for r in await conn.fetch(self.sql, *columns)}
+                self.flushes += 1
+                if inserted is None:
+                    self.written += len(rows)
+                    return
+                written: Written = []
+                for row, context in batch:
+                    if row[0] in inserted:
+                        inserted.discard(row[0])  # a duplicate id within the batch is written once
+                        written.append((row, context))
+                self.written += len(written)
+                self.skipped += len(rows) - len(written)
+                try:
+                    self.on_written(written)
+                except Exception:
+                    logger.exception("%s: on_written callback failed", self.component)
+                return
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    self.dropped_failed += len(rows)
+                    logger.warning("%s: dropping %d rows after %d retries: %s", self.component, len(rows), attempt, e)
+                    return
+                self.retries += 1
+                await asyncio.sleep(self.retry_backoff * (2 ** attempt))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "skipped": self.skipped,
+            "flushes": self.flushes,
+            "retries": self.retries,
+            "dropped_full": self.dropped_full,
+            "dropped_failed": self.dropped_failed,
+        }
@@ -0,0 +1,54 @@
+"""JSON responses encoded with orjson, byte-for-byte the same as Starlette's.
+
+Starlette's `JSONResponse` renders with
+`json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"))`.
+orjson writes the same compact UTF-8 output several times faster. Floats
+are formatted the same way, except outside 1e-4 <= |x| < 1e16, where
+Python switches to exponent form: Python writes `1e-05`/`1e+16`, orjson
+writes `0.00001`/`1e16`. Such values are rare in API payloads, so output
+that might hold one (an exponent, or `0.0000`) is rendered again with the
+standard encoder. The check also matches inside strings, which only costs
+a re-render. Either way, the bytes are the ones
+`JSONResponse` would have sent. One difference is left: NaN and Infinity,
+which `JSONResponse` refuses with an error, are written as `null`.
+
+Returning a `FastJSONResponse` from an endpoint also skips FastAPI's
+`jsonable_encoder` pass, so the content must already be plain JSON types:
+dict, list, tuple, str, int, float, bool or None.
+
+orjson is optional. Without it `FastJSONResponse` is a plain `JSONResponse`.
+"""
+from typing import Any
+import json
+import re
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+# an exponent, or a positional float below 1e-4
+_PYTHON_FORMATS_DIFFERENTLY = re.compile(rb"\d[eE][-+]?\d|0\.0000")
+
+
+def dumps(content: Any) -> bytes:
+    """Encode exactly as `JSONResponse.render` does, through orjson when possible."""
+
+    if orjson is not None:
+        try:
+            out = orjson.dumps(content)
+        except TypeError:
+            out = None  # a type orjson does not know; let json raise or handle it
+        if out is not None and _PYTHON_FORMATS_DIFFERENTLY.search(out) is None:
+            return out
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+HAS_ORJSON = orjson is not None
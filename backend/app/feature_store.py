@@ -0,0 +1,216 @@
+"""In-process sliding-window velocity feature store.
+
+Keeps transaction counts and amount sums per entity (customer, device, IP,
+merchant) over several windows, so the scorer gets velocity signals
+without n8n having to precompute `previous_tx_count_24h`.
+
+Each (entity, window) is a ring of time buckets, e.g. 24 one-hour buckets
+for the 24h window. Running totals are kept next to the ring. Advancing
+time expires only the buckets that fell out of the window, so a lookup or
+update is O(1) amortized, with at most `buckets` steps after a long idle
+gap.
+
+Memory is bounded. Each dimension keeps at most `max_keys` entities in LRU
+order, and entities idle for longer than the widest window are swept out.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+import math
+import time
+
+DEFAULT_DIMENSIONS: Tuple[str, ...] = ("customer_id", "device_id", "ip_address", "merchant_id")
+
+
+class Window(NamedTuple):
+    name: str
+    bucket_seconds: int
+    buckets: int
+
+    @property
+    def seconds(self) -> int:
+        return self.bucket_seconds * self.buckets
+
+
+DEFAULT_WINDOWS: Tuple[Window, ...] = (
+    Window("1m", 10, 6),
+    Window("1h", 300, 12),
+    Window("24h", 3600, 24),
+)
+
+
+class _Ring:
+    """Bucketed counter for one window; totals cover buckets (head-n, head]."""
+
+    __slots__ = ("ids", "counts", "sums", "head", "total_count", "total_sum")
+
+    def __init__(self, n: int):
+        self.ids: List[int] = [-1] * n
+        self.counts: List[int] = [0] * n
+        self.sums: List[float] = [0.0] * n
+        self.head = -1
+        self.total_count = 0
+        self.total_sum = 0.0
+
+    def advance(self, idx: int) -> None:
+        if idx <= self.head:
+            return
+        n = len(self.ids)
+        for step in range(max(self.head + 1, idx - n + 1), idx + 1):
+            slot = step % n
+            if self.ids[slot] != -1:
+                self.total_count -= self.counts[slot]
+                self.total_sum -= self.sums[slot]
+                self.ids[slot] = -1
+                self.counts[slot] = 0
+                self.sums[slot] = 0.0
+        if idx - self.head > n:
+            # every bucket expired; reset totals to avoid float drift
+            self.total_count = 0
+            self.total_sum = 0.0
+        self.head = idx
+
+    def add(self, idx: int, amount: float) -> None:
+        self.advance(idx)
+        n = len(self.ids)
+        if idx <= self.head - n:
+            return  # older than the window
+        slot = idx % n
+        self.ids[slot] = idx
+        self.counts[slot] += 1
+        self.sums[slot] += amount
+        self.total_count += 1
+        self.total_sum += amount
+
+
+class _Entity:
+    __slots__ = ("rings", "last_seen")
+
+    def __init__(self, windows: Sequence[Window]):
+        self.rings = [_Ring(w.buckets) for w in windows]
+        self.last_seen = 0.0
+
+
+def feature_name(dimension: str, window: str, kind: str) -> str:
+    """e.g. velocity_customer_id_24h_count / velocity_customer_id_24h_amount."""
+
+    return f"velocity_{dimension}_{window}_{kind}"
+
+
+class VelocityStore:
+    """Per-entity sliding-window counts and amount sums."""
+
+    def __init__(
+        self,
+        dimensions: Sequence[str] = DEFAULT_DIMENSIONS,
+        windows: Sequence[Window] = DEFAULT_WINDOWS,
+        max_keys: int = 100000,
+    ):
+        self.dimensions = tuple(dimensions)
+        self.windows = tuple(windows)
+        self.max_keys = max_keys
+        self.idle_ttl = max(w.seconds for w in self.windows)
+        self._entities: Dict[str, "OrderedDict[str, _Entity]"] = {d: OrderedDict() for d in self.dimensions}
+        self._zero = {
+            feature_name(d, w.name, kind): 0.0
+            for d in self.dimensions
+            for w in self.windows
+            for kind in ("count", "amount")
+        }
+        self.feature_names: Tuple[str, ...] = tuple(self._zero)
+        self.records = 0
+        self.evictions = 0
+        self.warm_started_rows = 0
+
+    def _entity(self, dimension: str, key: str, create: bool) -> Optional[_Entity]:
+        entities = self._entities[dimension]
+        entity = entities.get(key)
+        if entity is None:
+            if not create:
+                return None
+            entity = entities[key] = _Entity(self.windows)
+            if len(entities) > self.max_keys:
+                entities.popitem(last=False)
+                self.evictions += 1
+        else:
+            entities.move_to_end(key)
+        return entity
+
+    def record(self, tx: Mapping[str, Any], ts: Optional[float] = None) -> None:
+        ts = time.time() if ts is None else ts
+        try:
+            amount = float(tx.get("amount") or 0.0)
+        except (TypeError, ValueError):
+            amount = 0.0
+        if math.isnan(amount):
+            amount = 0.0
+        for dimension in self.dimensions:
+            key = tx.get(dimension)
+            if not key:
+                continue
+            entity = self._entity(dimension, str(key), create=True)
+            entity.last_seen = max(entity.last_seen, ts)
+            for window, ring in zip(self.windows, entity.rings):
+                ring.add(int(ts // window.bucket_seconds), amount)
+        self.records += 1
+
+    def lookup(self, tx: Mapping[str, Any], ts: Optional[float] = None) -> Dict[str, float]:
+        """Flat velocity features for the entities referenced by `tx`."""
+
+        ts = time.time() if ts is None else ts
+        out = dict(self._zero)
+        for dimension in self.dimensions:
+            key = tx.get(dimension)
+            if not key:
+                continue
+            entity = self._entity(dimension, str(key), create=False)
+            if entity is None:
+                continue
+            for window, ring in zip(self.windows, entity.rings):
+                ring.advance(int(ts // window.bucket_seconds))
+                out[feature_name(dimension, window.name, "count")] = float(ring.total_count)
+                out[feature_name(dimension, window.name, "amount")] = ring.total_sum
+        return out
+
+    def observe(self, tx: Mapping[str, Any], ts: Optional[float] = None) -> Dict[str, float]:
+        """Features describing activity *before* this transaction, then record it."""
+
+        ts = time.time() if ts is None else ts
+        features = self.lookup(tx, ts)
+        self.record(tx, ts)
+        return features
+
+    def warm_start(self, rows: Iterable[Tuple[Mapping[str, Any], float]]) -> int:
+        """Replay (tx, epoch_seconds) pairs, oldest first."""
+
+        n = 0
+        for tx, ts in rows:
+            self.record(tx, ts)
+            n += 1
+        self.warm_started_rows += n
+        return n
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Drop entities with no activity inside the widest window."""
+
+        cutoff = (time.time() if now is None else now) - self.idle_ttl
+        evicted = 0
+        for entities in self._entities.values():
+            # LRU order: the least recently touched entities are at the front
+            while entities:
+                key, entity = next(iter(entities.items()))
+                if entity.last_seen >= cutoff:
+                    break
+                del entities[key]
+                evicted += 1
+        self.evictions += evicted
+        return evicted
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "keys": {d: len(e) for d, e in self._entities.items()},
+            "max_keys": self.max_keys,
+            "windows": [w.name for w in self.windows],
+            "records": self.records,
+            "evictions": self.evictions,
+            "warm_started_rows": self.warm_started_rows,
+        }
@@ -0,0 +1,132 @@
+"""Idempotent /analyze: completed-result cache and single-flight.
+
+n8n retries on timeout with the same `transaction_id` (or `Idempotency-Key`
+header). Two mechanisms make those retries close to free:
+
+- `SingleFlight` coalesces concurrent requests for one key. Only the
+  first (the leader) computes; the others await the leader's result.
+- `IdempotencyCache` keeps finished envelopes in a bounded TTL/LRU map, so
+  a later retry returns the stored answer without scoring again, calling
+  the LLM again or writing another fraud_logs row.
+
+Each entry remembers a hash of the request body. If a key is reused with a
+different payload, the caller is told so instead of being sent someone
+else's answer.
+"""
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Mapping, NamedTuple, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import time
+
+
+def request_fingerprint(payload: Mapping[str, Any]) -> str:
+    """Stable hash of a request body (key order does not matter)."""
+
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class Entry(NamedTuple):
+    request_hash: str
+    response: Dict[str, Any]
+    expires_at: float
+
+
+class IdempotencyCache:
+    """Bounded key -> (request hash, response) map with TTL and LRU eviction."""
+
+    def __init__(self, maxsize: int = 20000, ttl: float = 86400.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, now: Optional[float] = None) -> Optional[Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= (time.monotonic() if now is None else now):
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: str, request_hash: str, response: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = Entry(request_hash, response, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class _LeaderGone(Exception):
+    """The leader was cancelled (client went away); followers retry."""
+
+
+class SingleFlight:
+    """At most one in-flight computation per key."""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run `fn` for `key`, or wait for the run already in flight.
+
+        Returns (result, shared), where `shared` is True when the result
+        came from another caller's computation. The leader's exception is
+        re-raised to every waiter.
+        """
+
+        while True:
+            fut = self._calls.get(key)
+            if fut is None:
+                break
+            self.coalesced += 1
+            try:
+                # shield: a follower going away must not cancel the leader
+                return await asyncio.shield(fut), True
+            except _LeaderGone:
+                self.coalesced -= 1
+                continue
+
+        fut = asyncio.get_running_loop().create_future()
+        self._calls[key] = fut
+        self.leaders += 1
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            fut.set_exception(_LeaderGone())
+            fut.exception()  # mark retrieved when nobody was waiting
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()
+            raise
+        else:
+            fut.set_result(result)
+            return result, False
+        finally:
+            self._calls.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._calls), "leaders": self.leaders, "coalesced": self.coalesced}
@@ -0,0 +1,331 @@
+"""Local IP intelligence: private-range detection and CIDR -> country/ASN lookups.
+
+Private and special-purpose ranges are built in and always on: RFC 1918
+(10/8, 172.16/12, 192.168/16), loopback, link-local, carrier-grade NAT
+(100.64/10), IPv6 unique-local (fc00::/7), link-local (fe80::/10) and
+`::1`. IPv4-mapped IPv6 addresses (`::ffff:10.0.0.1`) are checked as IPv4.
+
+Country and ASN come from a local data file, either a CSV:
+
+    network,country,asn,as_org
+    1.0.0.0/24,AU,13335,Cloudflare
+    2001:db8::/32,NL,64500,Example
+
+or an index directory built from one with `scripts/build_ipintel.py`.
+Nested networks are allowed; the most specific one wins. When building,
+the networks are flattened into disjoint ranges stored in sorted arrays,
+one set per address family:
+
+    v4_start.npy, v4_end.npy   uint32 range bounds (inclusive)
+    v6_start.npy, v6_end.npy   S16 big-endian range bounds (inclusive)
+    v4_rec.npy, v6_rec.npy     int32 record per range
+    rec_country.npy            S2 country per record (b"" when unknown)
+    rec_asn.npy, rec_org.npy   int64 ASN and int32 index into orgs.json (-1 when unknown)
+    orgs.json                  distinct AS organisation names
+    meta.json                  {"version": ..., "networks": ...}
+
+The arrays are memory-mapped (`np.load(mmap_mode="r")`), so loading an
+index is a few file opens whatever its size, and pages are read in as
+lookups touch them. orgs.json is only read on the first lookup that asks
+for an organisation name (the `/ipintel` endpoint; the scorer does not). A lookup is one `searchsorted` over the range starts:
+O(log n). A CSV is flattened in memory at load time, which is fine for
+small files but slower to start.
+
+`IpIntel.load` builds the new index completely before swapping one
+reference, so a reload never exposes a half-loaded index.
+"""
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple, Union
+import csv
+import ipaddress
+import json
+import os
+import time
+
+import numpy as np
+
+_PRIVATE_V4 = ("10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16", "127.0.0.0/8", "169.254.0.0/16", "100.64.0.0/10")
+_PRIVATE_V6 = ("fc00::/7", "fe80::/10", "::1/128")
+
+
+def _int_ranges(networks: Sequence[str]) -> Tuple[Tuple[int, int], ...]:
+    nets = (ipaddress.ip_network(n) for n in networks)
+    return tuple((int(n.network_address), int(n.broadcast_address)) for n in nets)
+
+
+_PRIVATE_RANGES = {4: _int_ranges(_PRIVATE_V4), 6: _int_ranges(_PRIVATE_V6)}
+
+Address = Union[ipaddress.IPv4Address, ipaddress.IPv6Address]
+
+
+class IPIntelError(ValueError):
+    """Raised when an IP data file or index is invalid."""
+
+
+class IPInfo(NamedTuple):
+    country: Optional[str]
+    asn: Optional[int]
+    as_org: Optional[str]
+
+
+def parse_ip(value: Any) -> Optional[Address]:
+    """An address, with IPv4-mapped IPv6 unwrapped to IPv4; None if `value` is not an IP."""
+
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        addr = ipaddress.ip_address(value.strip())
+    except ValueError:
+        return None
+    if addr.version == 6 and addr.ipv4_mapped is not None:
+        return addr.ipv4_mapped
+    return addr
+
+
+def is_private(addr: Address) -> bool:
+    x = int(addr)
+    return any(lo <= x <= hi for lo, hi in _PRIVATE_RANGES[addr.version])
+
+
+# -------------------------
+# Building the range index
+# -------------------------
+def read_csv(path: str) -> List[Tuple[str, Optional[str], Optional[int], Optional[str]]]:
+    """(network, country, asn, as_org) rows; a header row and `#` comments are skipped."""
+
+    rows = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for lineno, row in enumerate(csv.reader(f), start=1):
+            if not row or row[0].startswith("#") or row[0].strip().lower() == "network":
+                continue
+            row = [c.strip() for c in row] + [""] * (4 - len(row))
+            network, country, asn, org = row[:4]
+            try:
+                asn_value = int(asn.upper().removeprefix("AS")) if asn else None
+            except ValueError:
+                raise IPIntelError(f"{path}:{lineno}: bad asn {asn!r}") from None
+            if len(country) > 2 or not country.isascii():
+                raise IPIntelError(f"{path}:{lineno}: country must be a 2-letter code, got {country!r}")
+            rows.append((network, country.upper() or None, asn_value, org or None))
+    return rows
+
+
+def _flatten(ranges: List[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+    """Nested (start, end, record) ranges -> disjoint ranges, the innermost record winning."""
+
+    out: List[Tuple[int, int, int]] = []
+    stack: List[Tuple[int, int, int]] = []
+    pos = 0
+
+    def emit(start: int, end: int, rec: int) -> None:
+        if start > end:
+            return
+        if out and out[-1][2] == rec and out[-1][1] + 1 == start:
+            out[-1] = (out[-1][0], end, rec)
+        else:
+            out.append((start, end, rec))
+
+    for start, end, rec in sorted(ranges, key=lambda r: (r[0], -r[1])):
+        while stack and stack[-1][1] < start:
+            top = stack.pop()
+            emit(pos, top[1], top[2])
+            pos = top[1] + 1
+        if stack:
+            emit(pos, start - 1, stack[-1][2])
+        stack.append((start, end, rec))
+        pos = start
+    while stack:
+        top = stack.pop()
+        emit(pos, top[1], top[2])
+        pos = top[1] + 1
+    return out
+
+
+def build_arrays(rows: Iterable[Tuple[str, Optional[str], Optional[int], Optional[str]]]) -> Dict[str, Any]:
+    """Sorted range arrays plus the record table for `IPIndex`."""
+
+    records: Dict[Tuple, int] = {}
+    orgs: Dict[str, int] = {}
+    ranges: Dict[int, List[Tuple[int, int, int]]] = {4: [], 6: []}
+    count = 0
+    for network, country, asn, org in rows:
+        try:
+            net = ipaddress.ip_network(network, strict=False)
+        except ValueError:
+            raise IPIntelError(f"bad network {network!r}") from None
+        rec = records.setdefault((country, asn, orgs.setdefault(org, len(orgs)) if org else -1), len(records))
+        ranges[net.version].append((int(net.network_address), int(net.broadcast_address), rec))
+        count += 1
+
+    v4 = _flatten(ranges[4])
+    v6 = _flatten(ranges[6])
+    return {
+        "v4_start": np.array([r[0] for r in v4], dtype=np.uint32),
+        "v4_end": np.array([r[1] for r in v4], dtype=np.uint32),
+        "v4_rec": np.array([r[2] for r in v4], dtype=np.int32),
+        "v6_start": np.array([r[0].to_bytes(16, "big") for r in v6], dtype="S16"),
+        "v6_end": np.array([r[1].to_bytes(16, "big") for r in v6], dtype="S16"),
+        "v6_rec": np.array([r[2] for r in v6], dtype=np.int32),
+        "rec_country": np.array([(c or "").encode("ascii") for c, _, _ in records], dtype="S2"),
+        "rec_asn": np.array([-1 if a is None else a for _, a, _ in records], dtype=np.int64),
+        "rec_org": np.array([o for _, _, o in records], dtype=np.int32),
+        "orgs": list(orgs),
+        "networks": count,
+    }
+
+
+_ARRAYS = ("v4_start", "v4_end", "v4_rec", "v6_start", "v6_end", "v6_rec", "rec_country", "rec_asn", "rec_org")
+
+
+def _replace(path: str, write) -> None:
+    # new inode, then rename: a process that still maps the old file keeps valid pages
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def save_index(arrays: Dict[str, Any], directory: str, version: str) -> None:
+    """Write an index directory; meta.json goes last, so its mtime marks a complete index."""
+
+    os.makedirs(directory, exist_ok=True)
+    for name in _ARRAYS:
+        _replace(os.path.join(directory, f"{name}.npy"), lambda f: np.save(f, arrays[name]))
+    orgs = json.dumps(arrays["orgs"], ensure_ascii=False).encode("utf-8")
+    _replace(os.path.join(directory, "orgs.json"), lambda f: f.write(orgs))
+    meta = {"version": version, "networks": arrays["networks"], "built_at": time.time()}
+    _replace(os.path.join(directory, "meta.json"), lambda f: f.write(json.dumps(meta).encode("utf-8")))
+
+
+# -------------------------
+# Lookups
+# -------------------------
+class IPIndex:
+    """Disjoint, sorted IPv4/IPv6 ranges with a country/ASN record per range."""
+
+    def __init__(self, arrays: Dict[str, Any], version: str, networks: int, orgs_path: Optional[str] = None):
+        for name in _ARRAYS:
+            # a plain ndarray view of the memmap: same pages, no np.memmap overhead per call
+            setattr(self, name, np.asarray(arrays[name]).view(np.ndarray))
+        self._orgs: Optional[List[str]] = arrays.get("orgs")
+        self._orgs_path = orgs_path
+        self.version = version
+        self.networks = networks
+        if len(self.v4_start) != len(self.v4_end) or len(self.v6_start) != len(self.v6_end):
+            raise IPIntelError("range start/end arrays differ in length")
+        if not len(self.rec_country) == len(self.rec_asn) == len(self.rec_org):
+            raise IPIntelError("record arrays differ in length")
+
+    @classmethod
+    def load(cls, path: str) -> "IPIndex":
+        """An index directory (memory-mapped) or a CSV file (flattened in memory)."""
+
+        if os.path.isdir(path):
+            with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in _ARRAYS}
+            orgs_path = os.path.join(path, "orgs.json")
+            return cls(arrays, str(meta.get("version", "")), int(meta.get("networks", 0)), orgs_path)
+        arrays = build_arrays(read_csv(path))
+        return cls(arrays, f"csv-{int(os.path.getmtime(path))}", arrays["networks"])
+
+    def _org(self, i: int) -> Optional[str]:
+        if i < 0:
+            return None
+        if self._orgs is None:
+            with open(self._orgs_path, encoding="utf-8") as f:
+                self._orgs = json.load(f)
+        return self._orgs[i]
+
+    def lookup(self, addr: Address, with_org: bool = False) -> Optional[IPInfo]:
+        if addr.version == 4:
+            # a Python int key would make searchsorted cast the whole array on every call
+            starts, ends, recs, key = self.v4_start, self.v4_end, self.v4_rec, np.uint32(int(addr))
+        else:
+            starts, ends, recs, key = self.v6_start, self.v6_end, self.v6_rec, addr.packed
+        i = int(starts.searchsorted(key, side="right")) - 1
+        if i < 0:
+            return None
+        end = ends[i] if addr.version == 4 else bytes(ends[i]).ljust(16, b"\0")  # S16 drops trailing NULs
+        if end < key:
+            return None
+        rec = recs[i]
+        asn = int(self.rec_asn[rec])
+        return IPInfo(
+            self.rec_country[rec].decode("ascii") or None,
+            asn if asn >= 0 else None,
+            self._org(int(self.rec_org[rec])) if with_org else None,
+        )
+
+    def ranges(self) -> Dict[str, int]:
+        return {"v4": len(self.v4_start), "v6": len(self.v6_start)}
+
+
+class IpIntel:
+    """Active index plus counters; `load` swaps atomically. Works without an index (private check only)."""
+
+    def __init__(self):
+        self.active: Optional[IPIndex] = None
+        self.source: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self.loads = 0
+        self.load_errors = 0
+        self.lookups = 0
+        self.hits = 0
+        self.lookup_ns = 0
+
+    def load(self, path: str) -> IPIndex:
+        started = time.perf_counter()
+        try:
+            index = IPIndex.load(path)
+        except Exception:
+            self.load_errors += 1
+            raise
+        self.active = index
+        self.source = f"file:{os.path.abspath(path)}"
+        self.loaded_at = time.time()
+        self.load_seconds = time.perf_counter() - started
+        self.loads += 1
+        return index
+
+    def lookup(self, addr: Address, with_org: bool = False) -> Optional[IPInfo]:
+        index = self.active
+        if index is None:
+            return None
+        started = time.perf_counter_ns()
+        info = index.lookup(addr, with_org)
+        self.lookup_ns += time.perf_counter_ns() - started
+        self.lookups += 1
+        if info is not None:
+            self.hits += 1
+        return info
+
+    def features(self, ip: Any) -> Dict[str, Any]:
+        """`ip_is_private`, `ip_country` and `ip_asn` for an address (all None if it does not parse)."""
+
+        addr = parse_ip(ip)
+        if addr is None:
+            return {"ip_is_private": None, "ip_country": None, "ip_asn": None}
+        info = self.lookup(addr)
+        return {
+            "ip_is_private": is_private(addr),
+            "ip_country": info.country if info is not None else None,
+            "ip_asn": info.asn if info is not None else None,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        index = self.active
+        return {
+            "loaded": index is not None,
+            "version": index.version if index is not None else None,
+            "networks": index.networks if index is not None else 0,
+            "ranges": index.ranges() if index is not None else None,
+            "source": self.source,
+            "loaded_at": self.loaded_at,
+            "load_ms": round(self.load_seconds * 1000, 3) if self.load_seconds is not None else None,
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+            "lookups": self.lookups,
+            "hit_rate": round(self.hits / self.lookups, 6) if self.lookups else None,
+            "avg_lookup_us": round(self.lookup_ns / self.lookups / 1000.0, 3) if self.lookups else 0.0,
+        }
@@ -0,0 +1,207 @@
+"""Failure isolation for the LLM path: circuit breaker, adaptive timeout, hedging.
+
+When the completion endpoint degrades, waiting the full read timeout on
+every request only makes every caller slow. Three pieces keep the wizard
+fast:
+
+- `CircuitBreaker` tracks error and slow-call rates over a rolling window
+  of one-second buckets. It opens when either rate crosses its threshold,
+  so callers go straight to the deterministic wizard. After a cool-down it
+  lets a few probe calls through (half-open) and closes again when they
+  succeed. A half-open phase that reaches no verdict within its own
+  time limit reopens, so lost probes cannot wedge the breaker.
+- `LatencyTracker` keeps recent successful round-trip times. Its p95 and
+  p99 drive the per-call timeout and the hedge delay, so the timeout
+  follows what the endpoint actually does instead of a fixed 20 s.
+- `HedgeBudget` caps hedged (duplicate) requests at a fraction of all calls,
+  so hedging cannot double the load on a struggling endpoint.
+"""
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """Rolling-window breaker on error rate and slow-call rate."""
+
+    def __init__(
+        self,
+        window_seconds: int = 30,
+        min_calls: int = 20,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 10.0,
+        slow_call_rate: float = 0.8,
+        open_seconds: float = 15.0,
+        half_open_probes: int = 3,
+        half_open_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.half_open_seconds = half_open_seconds
+        self.clock = clock
+
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.changed_at = clock()
+        # one [second, calls, failures, slow] bucket per slot
+        self._buckets: List[List[int]] = [[-1, 0, 0, 0] for _ in range(window_seconds)]
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.rejected = 0
+        self.opened = 0
+
+    def _transition(self, state: str) -> None:
+        self.state = state
+        self.changed_at = self.clock()
+        if state == OPEN:
+            self.opened_at = self.changed_at
+            self.opened += 1
+        elif state == HALF_OPEN:
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        else:
+            for bucket in self._buckets:
+                bucket[:] = [-1, 0, 0, 0]
+
+    def allow(self) -> bool:
+        """True if a call may go out now (reserves a probe when half-open)."""
+
+        if self.state == OPEN:
+            if self.clock() - self.opened_at < self.open_seconds:
+                self.rejected += 1
+                return False
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            if self.clock() - self.changed_at >= self.half_open_seconds:
+                # probes never reported back; start a fresh cool-down
+                self._transition(OPEN)
+                self.rejected += 1
+                return False
+            if self._probes_in_flight >= self.half_open_probes:
+                self.rejected += 1
+                return False
+            self._probes_in_flight += 1
+        return True
+
+    def release(self) -> None:
+        """Give back a call `allow()` let through that ended without an outcome (e.g. cancelled)."""
+
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def record(self, ok: bool, latency: float) -> None:
+        """Outcome of a call that `allow()` let through."""
+
+        slow = latency >= self.slow_call_seconds
+        if self.state == HALF_OPEN:
+            self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if ok and not slow:
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._transition(CLOSED)
+            else:
+                self._transition(OPEN)
+            return
+
+        second = int(self.clock())
+        bucket = self._buckets[second % self.window_seconds]
+        if bucket[0] != second:
+            bucket[:] = [second, 0, 0, 0]
+        bucket[1] += 1
+        bucket[2] += 0 if ok else 1
+        bucket[3] += 1 if slow else 0
+
+        if self.state == CLOSED:
+            calls, failures, slow_calls = self._totals(second)
+            if calls >= self.min_calls and (
+                failures / calls >= self.failure_rate or slow_calls / calls >= self.slow_call_rate
+            ):
+                self._transition(OPEN)
+
+    def _totals(self, now_second: int):
+        calls = failures = slow = 0
+        oldest = now_second - self.window_seconds
+        for second, c, f, s in self._buckets:
+            if second > oldest:
+                calls += c
+                failures += f
+                slow += s
+        return calls, failures, slow
+
+    def stats(self) -> Dict[str, Any]:
+        calls, failures, slow = self._totals(int(self.clock()))
+        return {
+            "state": self.state,
+            "state_code": _STATE_CODES[self.state],
+            "seconds_in_state": round(self.clock() - self.changed_at, 3),
+            "window_calls": calls,
+            "window_failure_rate": round(failures / calls, 4) if calls else 0.0,
+            "window_slow_rate": round(slow / calls, 4) if calls else 0.0,
+            "times_opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class LatencyTracker:
+    """Percentiles over the most recent successful latencies."""
+
+    def __init__(self, maxlen: int = 256, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples: Deque[float] = deque(maxlen=maxlen)
+        self._sorted: List[float] = []
+        self._dirty = 0
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+        self._dirty += 1
+
+    def percentile(self, q: float) -> Optional[float]:
+        """q in [0, 1]; None until `min_samples` have been seen."""
+
+        if len(self._samples) < self.min_samples:
+            return None
+        # re-sort lazily; a few stale samples do not matter for a timeout
+        if self._dirty >= 16 or not self._sorted:
+            self._sorted = sorted(self._samples)
+            self._dirty = 0
+        idx = min(len(self._sorted) - 1, int(q * len(self._sorted)))
+        return self._sorted[idx]
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p95, p99 = self.percentile(0.5), self.percentile(0.95), self.percentile(0.99)
+        return {
+            "samples": len(self._samples),
+            "p50": None if p50 is None else round(p50, 4),
+            "p95": None if p95 is None else round(p95, 4),
+            "p99": None if p99 is None else round(p99, 4),
+        }
+
+
+class HedgeBudget:
+    """Token bucket that earns `ratio` hedge tokens per call."""
+
+    def __init__(self, ratio: float = 0.1, burst: float = 10.0):
+        self.ratio = ratio
+        self.burst = burst
+        self.tokens = burst
+
+    def deposit(self) -> None:
+        self.tokens = min(self.burst, self.tokens + self.ratio)
+
+    def take(self) -> bool:
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
@@ -0,0 +1,273 @@
+"""Tiny Prometheus-format metrics and per-stage request timing.
+
+This has no dependency on prometheus_client. Counters, gauges and
+fixed-bucket histograms are plain Python objects updated inline on the
+event loop, which has no locks or threads. They are rendered in the text
+exposition format on demand by `/metrics`. Recording a histogram sample
+is a bisect plus two additions, cheap enough to leave on in production.
+
+With several worker processes, each worker has its own registry.
+`Registry.snapshot` turns one into plain data, and `render_snapshots`
+merges the snapshots of all workers into one exposition. Counters and
+histograms are summed. Gauges and collector values get a `worker` label,
+since adding up e.g. queue depths or load times across workers would be
+meaningless for some of them.
+
+`StageTimer` times the stages of one request with monotonic
+`perf_counter_ns` and renders them as a `Server-Timing` header and as
+millisecond values for the response `meta`.
+"""
+from bisect import bisect_left
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import math
+import time
+
+# Latency buckets in seconds: 0.1 ms .. 30 s.
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+Sample = Tuple[Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in self.values.items()
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels: str, value: float) -> None:
+        self.values[labels] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self.values.get(labels)
+        if series is None:
+            series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        out = self.header()
+        for labels, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                le = 'le="%s"' % _fmt(bound)
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {repr(series[-1])}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._callbacks: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def collector(self, fn: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]) -> Callable:
+        """Register a callback yielding (name, kind, help, [(labels, value), ...]).
+
+        Used for values that already live elsewhere (cache stats, pool size),
+        so they are read at scrape time instead of being mirrored on every
+        request.
+        """
+
+        self._callbacks.append(fn)
+        return fn
+
+    def _families(self) -> Iterable[Tuple[str, str, str, List[Sample]]]:
+        for fn in self._callbacks:
+            try:
+                families = list(fn())
+            except Exception:
+                continue
+            yield from families
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, kind, help, samples in self._families():
+            lines.extend(_render_family(name, kind, help, samples))
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Every metric and collector value as JSON-friendly data (see `render_snapshots`)."""
+
+        return {
+            "metrics": [
+                [m.name, m.kind, m.help, list(m.labelnames), list(getattr(m, "buckets", ())),
+                 [[list(k), v] for k, v in m.values.items()]]
+                for m in self._metrics
+            ],
+            "families": [
+                [name, kind, help, [[dict(labels), float(value)] for labels, value in samples]]
+                for name, kind, help, samples in self._families()
+            ],
+        }
+
+
+def _render_family(name: str, kind: str, help: str, samples: Iterable[Sample]) -> List[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(list(labels), list(labels.values()))} {_fmt(float(value))}")
+    return lines
+
+
+def render_snapshots(snapshots: Dict[str, Dict[str, Any]]) -> str:
+    """One exposition for several workers' snapshots, keyed by worker id."""
+
+    merged: Dict[str, _Metric] = {}
+    families: Dict[str, Tuple[str, str, List[Sample]]] = {}
+    for worker, snap in sorted(snapshots.items()):
+        for name, kind, help, labelnames, buckets, values in snap["metrics"]:
+            metric = merged.get(name)
+            if metric is None:
+                if kind == "histogram":
+                    metric = Histogram(name, help, labelnames, buckets)
+                elif kind == "gauge":
+                    metric = Gauge(name, help, tuple(labelnames) + ("worker",))
+                else:
+                    metric = Counter(name, help, labelnames)
+                merged[name] = metric
+            for labels, value in values:
+                key = tuple(labels)
+                if kind == "histogram":
+                    series = metric.values.get(key)
+                    metric.values[key] = value if series is None else [a + b for a, b in zip(series, value)]
+                elif kind == "gauge":
+                    metric.values[key + (worker,)] = value
+                else:
+                    metric.values[key] = metric.values.get(key, 0.0) + value
+        for name, kind, help, samples in snap["families"]:
+            family = families.setdefault(name, (kind, help, []))
+            family[2].extend(({**labels, "worker": worker}, value) for labels, value in samples)
+    lines: List[str] = []
+    for metric in merged.values():
+        lines.extend(metric.render())
+    for name, (kind, help, samples) in families.items():
+        lines.extend(_render_family(name, kind, help, samples))
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+DB_POOL_WAIT = REGISTRY.histogram(
+    "fraud_wizard_db_pool_wait_seconds",
+    "Time spent waiting to acquire a Postgres pool connection.",
+    ("component",),
+)
+
+
+@asynccontextmanager
+async def timed_acquire(pool: Any, component: str):
+    """`pool.acquire()` that records the wait in DB_POOL_WAIT."""
+
+    started = time.perf_counter()
+    async with pool.acquire() as conn:
+        DB_POOL_WAIT.observe(time.perf_counter() - started, component)
+        yield conn
+
+
+class StageTimer:
+    """Monotonic per-stage timings for one request."""
+
+    __slots__ = ("started_ns", "stages")
+
+    def __init__(self):
+        self.started_ns = time.perf_counter_ns()
+        self.stages: Dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0) + time.perf_counter_ns() - t0
+
+    def total_ns(self) -> int:
+        return time.perf_counter_ns() - self.started_ns
+
+    def as_ms(self, total: Optional[int] = None) -> Dict[str, float]:
+        out = {name: round(ns / 1e6, 3) for name, ns in self.stages.items()}
+        out["total"] = round((self.total_ns() if total is None else total) / 1e6, 3)
+        return out
+
+    def server_timing(self, total: Optional[int] = None) -> str:
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.as_ms(total).items())
+
+    def observe_into(self, histogram: Histogram, total_histogram: Optional[Histogram] = None, total: Optional[int] = None) -> None:
+        for name, ns in self.stages.items():
+            histogram.observe(ns / 1e9, name)
+        if total_histogram is not None:
+            total_histogram.observe((self.total_ns() if total is None else total) / 1e9)
@@ -0,0 +1,95 @@
+"""Coalesce concurrent awaitable calls into batched handler invocations.
+
+Callers `await batcher.submit(item)`. Items are collected until either
+`max_batch_size` are pending or `max_wait` seconds have passed since the
+first one arrived. The batch is then handed to `handler(items)`, which
+returns one result per item in the same order. A result that is an
+exception instance is raised to that caller only. An exception from the
+handler itself is raised to every caller in the batch.
+
+There is no background task. A timer armed on the first pending item does
+the flushing, so an idle batcher costs nothing.
+"""
+from typing import Any, Awaitable, Callable, Dict, Generic, List, Optional, Set, Tuple, TypeVar
+import asyncio
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class MicroBatcher(Generic[T, R]):
+    def __init__(
+        self,
+        handler: Callable[[List[T]], Awaitable[List[Any]]],
+        max_batch_size: int = 8,
+        max_wait: float = 0.005,
+        on_flush: Optional[Callable[[int, str], None]] = None,
+    ):
+        self.handler = handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.on_flush = on_flush  # (batch size, "full" | "window") for metrics
+        self._pending: List[Tuple[T, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._running: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item: T) -> R:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((item, fut))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush("full")
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush, "window")
+        return await fut
+
+    def _flush(self, reason: str) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[: self.max_batch_size]
+            del self._pending[: self.max_batch_size]
+            # skip callers that already gave up
+            batch = [(item, fut) for item, fut in batch if not fut.done()]
+            if not batch:
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            if self.on_flush is not None:
+                self.on_flush(len(batch), reason)
+            task = asyncio.create_task(self._run(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run(self, batch: List[Tuple[T, asyncio.Future]]) -> None:
+        try:
+            results = await self.handler([item for item, _ in batch])
+        except Exception as e:
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for (_, fut), result in zip(batch, results):
+            if fut.done():
+                continue
+            if isinstance(result, BaseException):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
+        for _, fut in batch[len(results):]:
+            if not fut.done():
+                fut.set_exception(RuntimeError("microbatch_missing_result"))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_fill": round(self.items / self.batches, 3) if self.batches else 0.0,
+            "pending": len(self._pending),
+            "in_flight": len(self._running),
+        }
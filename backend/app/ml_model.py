@@ -0,0 +1,318 @@
+"""NumPy inference for a trained fraud model, blended with the rule score.
+
+Two model families are supported, loaded from a local `.json` or `.npz`
+file. Inference is CPU-only NumPy with no network calls.
+
+Logistic regression:
+
+    {"type": "logistic", "version": "lr-2026-10",
+     "features": ["amount", "previous_tx_count_24h", "channel=web"],
+     "weights": [0.0004, 0.08, 0.3], "bias": -2.1,
+     "transforms": {"amount": "log1p"}, "fill": {"previous_tx_count_24h": 0},
+     "baseline": {"amount": 120.0}}
+
+Gradient-boosted trees (node arrays per tree, as exported by most GBDT
+libraries; `feature` is -1 on leaves, `value` is the leaf output in logit
+space, `missing_left` sends NaN left when true, optional `cover` is the
+training row count per node):
+
+    {"type": "gbdt", "version": "gb-7", "features": [...], "base_score": -1.2,
+     "trees": [{"feature": [0, -1, -1], "threshold": [5000, 0, 0],
+                "left": [1, -1, -1], "right": [2, -1, -1],
+                "value": [0, -0.4, 1.3], "missing_left": [true, true, true]}]}
+
+An `.npz` file holds the same fields as arrays. For trees, `feature`,
+`threshold`, `left`, `right`, `value` (and optionally `missing_left` and
+`cover`) are padded to (n_trees, max_nodes).
+
+`baseline` (logistic) and `cover` (trees) are only used by `app/explain.py`
+as the reference point for per-feature contributions. Without them the
+baseline is `fill` and both children of a split count equally.
+
+A feature named `field=value` is a one-hot indicator for a categorical
+field. Other features are read as floats. Missing values become NaN and
+are then replaced by `fill` (logistic) or routed by `missing_left`
+(trees).
+
+Trees are evaluated all at once. A (rows × trees) node-index matrix
+advances one level per step, so a batch costs O(max_depth) vector steps
+whatever the tree count.
+
+`ModelScorer.load` builds and checks the new model completely before
+swapping one reference, so a request that is mid-inference finishes on
+the model it started with.
+"""
+from typing import Any, Dict, Mapping, Optional, Sequence
+import json
+import os
+import time
+
+import numpy as np
+
+LOGISTIC = "logistic"
+GBDT = "gbdt"
+
+_TRANSFORMS = {
+    "log1p": lambda x: np.log1p(np.maximum(x, 0.0)),
+    "identity": lambda x: x,
+}
+
+
+class ModelSpecError(ValueError):
+    """Raised when a model file is invalid."""
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -40.0, 40.0)))
+
+
+def _to_float(x: Any) -> float:
+    if x is None:
+        return np.nan
+    if isinstance(x, bool):
+        return 1.0 if x else 0.0
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def feature_matrix(features: Sequence[str], rows: Sequence[Mapping[str, Any]]) -> np.ndarray:
+    """(n_rows, n_features) float64 matrix; NaN where a value is missing."""
+
+    n = len(rows)
+    out = np.empty((n, len(features)), dtype=np.float64)
+    for j, name in enumerate(features):
+        field, sep, category = name.partition("=")
+        if sep:
+            out[:, j] = np.fromiter(
+                (1.0 if str(r.get(field)) == category else 0.0 for r in rows), dtype=np.float64, count=n
+            )
+        else:
+            out[:, j] = np.fromiter((_to_float(r.get(field)) for r in rows), dtype=np.float64, count=n)
+    return out
+
+
+def _per_feature(values: Any, features: Sequence[str], default: float) -> np.ndarray:
+    """A {feature: value} mapping (JSON) or an aligned array (npz) as a vector."""
+
+    if values is None:
+        return np.full(len(features), default, dtype=np.float64)
+    if isinstance(values, Mapping):
+        return np.array([_to_float(values.get(f, default)) for f in features], dtype=np.float64)
+    out = np.asarray(values, dtype=np.float64).reshape(-1)
+    if out.shape[0] != len(features):
+        raise ModelSpecError(f"{len(features)} features but {out.shape[0]} per-feature values")
+    return out
+
+
+class LogisticModel:
+    kind = LOGISTIC
+
+    def __init__(self, spec: Mapping[str, Any]):
+        self.version = str(spec.get("version") or "unversioned")
+        self.features = [str(f) for f in spec["features"]]
+        self.weights = np.asarray(spec["weights"], dtype=np.float64).reshape(-1)
+        self.bias = float(np.asarray(spec.get("bias", 0.0)).reshape(()))
+        if self.weights.shape[0] != len(self.features):
+            raise ModelSpecError(f"{len(self.features)} features but {self.weights.shape[0]} weights")
+        self.fill = _per_feature(spec.get("fill"), self.features, 0.0)
+        transforms = spec.get("transforms") or {}
+        unknown = {t for t in transforms.values() if t not in _TRANSFORMS}
+        if unknown:
+            raise ModelSpecError(f"unknown transforms {sorted(unknown)}")
+        self.transforms = [(self.features.index(f), _TRANSFORMS[t]) for f, t in transforms.items() if f in self.features]
+        self.baseline = _per_feature(spec.get("baseline"), self.features, np.nan)
+
+    def prepare(self, X: np.ndarray) -> np.ndarray:
+        """Fill missing values and apply transforms (the matrix the weights see)."""
+
+        X = np.where(np.isnan(X), self.fill, X)
+        for j, fn in self.transforms:
+            X[:, j] = fn(X[:, j])
+        return X
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        return _sigmoid(self.prepare(X) @ self.weights + self.bias)
+
+
+class TreeEnsemble:
+    kind = GBDT
+
+    def __init__(self, spec: Mapping[str, Any]):
+        self.version = str(spec.get("version") or "unversioned")
+        self.features = [str(f) for f in spec["features"]]
+        self.base_score = float(np.asarray(spec.get("base_score", 0.0)).reshape(()))
+        if "trees" in spec:
+            trees = spec["trees"]
+            if not trees:
+                raise ModelSpecError("gbdt model has no trees")
+            width = max(len(t["feature"]) for t in trees)
+
+            def pad(key: str, fill: Any, dtype) -> np.ndarray:
+                out = np.full((len(trees), width), fill, dtype=dtype)
+                for i, t in enumerate(trees):
+                    col = t.get(key)
+                    if col is not None:
+                        out[i, : len(col)] = col
+                return out
+
+            self.feature = pad("feature", -1, np.int64)
+            self.threshold = pad("threshold", 0.0, np.float64)
+            self.left = pad("left", -1, np.int64)
+            self.right = pad("right", -1, np.int64)
+            self.value = pad("value", 0.0, np.float64)
+            self.missing_left = pad("missing_left", True, bool)
+            self.cover = pad("cover", 1.0, np.float64)
+        else:
+            self.feature = np.asarray(spec["feature"], dtype=np.int64)
+            self.threshold = np.asarray(spec["threshold"], dtype=np.float64)
+            self.left = np.asarray(spec["left"], dtype=np.int64)
+            self.right = np.asarray(spec["right"], dtype=np.int64)
+            self.value = np.asarray(spec["value"], dtype=np.float64)
+            missing = spec.get("missing_left")
+            self.missing_left = (
+                np.ones_like(self.feature, dtype=bool) if missing is None else np.asarray(missing, dtype=bool)
+            )
+            cover = spec.get("cover")
+            self.cover = np.ones(self.feature.shape) if cover is None else np.asarray(cover, dtype=np.float64)
+        self._validate()
+
+    def _validate(self) -> None:
+        shape = self.feature.shape
+        if len(shape) != 2 or any(a.shape != shape for a in (self.threshold, self.left, self.right, self.value, self.missing_left, self.cover)):
+            raise ModelSpecError("tree arrays must share one (n_trees, max_nodes) shape")
+        internal = self.feature >= 0
+        if (self.feature >= len(self.features)).any():
+            raise ModelSpecError("tree references a feature index out of range")
+        for child in (self.left, self.right):
+            if (internal & ((child < 0) | (child >= shape[1]))).any():
+                raise ModelSpecError("internal node with a missing or out-of-range child")
+        # children must point forward, which also bounds the walk by the node count
+        idx = np.arange(shape[1])
+        if (internal & ((self.left <= idx) | (self.right <= idx))).any():
+            raise ModelSpecError("tree nodes must be ordered parent before child")
+        self.max_depth = self._depth()
+
+    def _depth(self) -> int:
+        depth = np.zeros(self.feature.shape, dtype=np.int64)
+        for node in range(self.feature.shape[1]):
+            internal = self.feature[:, node] >= 0
+            rows = np.flatnonzero(internal)
+            for child in (self.left, self.right):
+                c = child[rows, node]
+                depth[rows, c] = np.maximum(depth[rows, c], depth[rows, node] + 1)
+        return int(depth.max()) if depth.size else 0
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        n, t = X.shape[0], self.feature.shape[0]
+        trees = np.broadcast_to(np.arange(t), (n, t))
+        rows = np.broadcast_to(np.arange(n)[:, None], (n, t))
+        node = np.zeros((n, t), dtype=np.int64)
+        for _ in range(self.max_depth):
+            feat = self.feature[trees, node]
+            internal = feat >= 0
+            if not internal.any():
+                break
+            x = X[rows, np.maximum(feat, 0)]
+            go_left = np.where(np.isnan(x), self.missing_left[trees, node], x <= self.threshold[trees, node])
+            nxt = np.where(go_left, self.left[trees, node], self.right[trees, node])
+            node = np.where(internal, nxt, node)
+        return _sigmoid(self.base_score + self.value[trees, node].sum(axis=1))
+
+
+def _spec_from_npz(path: str) -> Dict[str, Any]:
+    with np.load(path, allow_pickle=False) as data:
+        spec: Dict[str, Any] = {k: data[k] for k in data.files}
+    for key in ("type", "version"):
+        if key in spec:
+            spec[key] = str(spec[key].reshape(()))
+    spec["features"] = [str(f) for f in spec.get("features", [])]
+    return spec
+
+
+def build_model(spec: Mapping[str, Any]):
+    kind = spec.get("type")
+    if not spec.get("features"):
+        raise ModelSpecError("model needs a non-empty 'features' list")
+    try:
+        if kind == LOGISTIC:
+            return LogisticModel(spec)
+        if kind == GBDT:
+            return TreeEnsemble(spec)
+    except ModelSpecError:
+        raise
+    except (KeyError, TypeError, ValueError) as e:
+        raise ModelSpecError(f"invalid {kind} model: {e}") from e
+    raise ModelSpecError(f"model type must be {LOGISTIC!r} or {GBDT!r}")
+
+
+def load_model(path: str):
+    """Read and build a model from a .json or .npz file."""
+
+    if path.endswith(".npz"):
+        spec = _spec_from_npz(path)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+    return build_model(spec)
+
+
+class ModelScorer:
+    """Active model plus load/inference counters; `load` swaps atomically."""
+
+    def __init__(self):
+        self.active = None
+        self.source: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self.loads = 0
+        self.load_errors = 0
+        self.batches = 0
+        self.rows = 0
+        self.infer_ns = 0
+
+    def load(self, path: str):
+        started = time.perf_counter()
+        try:
+            model = load_model(path)
+            # one dry run so a shape problem fails here, not on a request
+            model.predict(np.zeros((1, len(model.features))))
+        except Exception:
+            self.load_errors += 1
+            raise
+        self.active = model
+        self.source = f"file:{os.path.abspath(path)}"
+        self.loaded_at = time.time()
+        self.load_seconds = time.perf_counter() - started
+        self.loads += 1
+        return model
+
+    def predict(self, rows: Sequence[Mapping[str, Any]], model=None) -> np.ndarray:
+        """Fraud probability per row from the active (or given) model."""
+
+        model = model or self.active
+        started = time.perf_counter_ns()
+        out = model.predict(feature_matrix(model.features, rows))
+        self.infer_ns += time.perf_counter_ns() - started
+        self.batches += 1
+        self.rows += len(rows)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        model = self.active
+        return {
+            "loaded": model is not None,
+            "type": model.kind if model is not None else None,
+            "version": model.version if model is not None else None,
+            "features": len(model.features) if model is not None else 0,
+            "source": self.source,
+            "loaded_at": self.loaded_at,
+            "load_ms": round(self.load_seconds * 1000, 3) if self.load_seconds is not None else None,
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_batch": round(self.rows / self.batches, 3) if self.batches else 0.0,
+            "avg_infer_us_per_row": round(self.infer_ns / self.rows / 1000.0, 3) if self.rows else 0.0,
+        }
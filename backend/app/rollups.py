@@ -0,0 +1,249 @@
+"""Incrementally maintained alert counters for /alerts/stats.
+
+Every accepted fraud_logs row adds one to a few counters, keyed by
+(granularity, bucket start, dimension, value):
+
+- granularity: `minute` and `hour`
+- dimension: `action` (suggested_action), `risk_level` and `rule` (one per
+  rule that fired)
+
+Deltas pile up in memory and are flushed in batches to `alert_rollups`
+(migration 0008) with `count = count + delta` upserts. A stats query then
+sums buckets instead of scanning fraud_logs. Whole hours inside the range
+come from hour buckets and the partial hours at either end from minute
+buckets, so the cost is O(buckets) while the edges stay minute-exact.
+Minute buckets are pruned after a retention period. Ranges older than
+that are widened to whole hours.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+
+from app.metrics import timed_acquire
+
+logger = logging.getLogger(__name__)
+
+MINUTE = "minute"
+HOUR = "hour"
+DIMENSIONS = ("action", "risk_level", "rule")
+
+# (granularity, bucket_start, dimension, value)
+RollupKey = Tuple[str, datetime, str, str]
+
+UPSERT_ROLLUPS_SQL = (
+    "INSERT INTO alert_rollups(granularity, bucket_start, dimension, value, count) "
+    "SELECT * FROM unnest($1::text[], $2::timestamptz[], $3::text[], $4::text[], $5::int8[]) "
+    "ON CONFLICT (granularity, bucket_start, dimension, value) "
+    "DO UPDATE SET count = alert_rollups.count + EXCLUDED.count"
+)
+
+PRUNE_MINUTES_SQL = "DELETE FROM alert_rollups WHERE granularity = 'minute' AND bucket_start < $1"
+
+
+def floor_minute(ts: datetime) -> datetime:
+    return ts.replace(second=0, microsecond=0)
+
+
+def floor_hour(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+def ceil_minute(ts: datetime) -> datetime:
+    floored = floor_minute(ts)
+    return floored if floored == ts else floored + timedelta(minutes=1)
+
+
+def ceil_hour(ts: datetime) -> datetime:
+    floored = floor_hour(ts)
+    return floored if floored == ts else floored + timedelta(hours=1)
+
+
+def bucket_ranges(
+    since: datetime, until: datetime, minute_floor: Optional[datetime] = None
+) -> Tuple[Tuple[datetime, datetime], List[Tuple[datetime, datetime]]]:
+    """Split [since, until) into (hour range, [minute ranges]).
+
+    Edges are rounded out to whole minutes. Before `minute_floor` (the
+    retention cut-off) minute buckets are gone, so edges there are rounded
+    out to whole hours instead.
+    """
+
+    start = floor_minute(since)
+    end = ceil_minute(until)
+    if minute_floor is not None and start < minute_floor:
+        start = floor_hour(start)
+    if minute_floor is not None and end < minute_floor:
+        end = ceil_hour(end)
+    h0, h1 = ceil_hour(start), floor_hour(end)
+    if h0 >= h1:
+        return (end, end), [(start, end)]
+    return (h0, h1), [r for r in ((start, h0), (h1, end)) if r[0] < r[1]]
+
+
+def build_stats_query(
+    hours: Tuple[datetime, datetime], minutes: Sequence[Tuple[datetime, datetime]]
+) -> Tuple[str, List[Any]]:
+    """Return (sql, args) summing rollups per (dimension, value)."""
+
+    args: List[Any] = []
+
+    def arg(value: Any) -> str:
+        args.append(value)
+        return f"${len(args)}"
+
+    ranges = []
+    if hours[0] < hours[1]:
+        ranges.append(
+            f"(granularity = 'hour' AND bucket_start >= {arg(hours[0])} AND bucket_start < {arg(hours[1])})"
+        )
+    for lo, hi in minutes:
+        ranges.append(f"(granularity = 'minute' AND bucket_start >= {arg(lo)} AND bucket_start < {arg(hi)})")
+    if not ranges:
+        ranges.append("FALSE")
+    sql = (
+        "SELECT dimension, value, sum(count)::int8 AS count FROM alert_rollups WHERE "
+        + " OR ".join(ranges)
+        + " GROUP BY dimension, value"
+    )
+    return sql, args
+
+
+def _in_ranges(
+    key: RollupKey, hours: Tuple[datetime, datetime], minutes: Sequence[Tuple[datetime, datetime]]
+) -> bool:
+    granularity, bucket, _, _ = key
+    if granularity == HOUR:
+        return hours[0] <= bucket < hours[1]
+    return any(lo <= bucket < hi for lo, hi in minutes)
+
+
+class RollupAggregator:
+    """Counts alerts in memory and flushes the deltas to `alert_rollups`."""
+
+    def __init__(
+        self,
+        pool=None,
+        flush_interval: float = 5.0,
+        minute_retention: float = 7 * 86400.0,
+        max_pending: int = 100000,
+    ):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.minute_retention = minute_retention
+        self.max_pending = max_pending
+        self._pending: Dict[RollupKey, int] = {}
+        # batch being written; still counted by pending_totals until it lands
+        self._inflight: Dict[RollupKey, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.added = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.dropped = 0
+
+    def add(
+        self,
+        created_at: datetime,
+        action: Optional[str],
+        risk_level: Optional[str],
+        rules: Iterable[str] = (),
+    ) -> None:
+        values = [("action", action), ("risk_level", risk_level)] + [("rule", r) for r in rules]
+        for bucket in ((MINUTE, floor_minute(created_at)), (HOUR, floor_hour(created_at))):
+            for dimension, value in values:
+                if value is None:
+                    continue
+                key = (bucket[0], bucket[1], dimension, str(value))
+                self._pending[key] = self._pending.get(key, 0) + 1
+        self.added += 1
+
+    def minute_floor(self, now: Optional[datetime] = None) -> datetime:
+        now = now or datetime.now(timezone.utc)
+        return floor_hour(now - timedelta(seconds=self.minute_retention))
+
+    def pending_totals(
+        self, hours: Tuple[datetime, datetime], minutes: Sequence[Tuple[datetime, datetime]]
+    ) -> Dict[Tuple[str, str], int]:
+        """Unflushed counts inside the same bucket ranges a stats query reads."""
+
+        totals: Dict[Tuple[str, str], int] = {}
+        for pending in (self._pending, self._inflight):
+            for key, count in pending.items():
+                if _in_ranges(key, hours, minutes):
+                    dim_value = (key[2], key[3])
+                    totals[dim_value] = totals.get(dim_value, 0) + count
+        return totals
+
+    def start(self) -> None:
+        if self._task is None and self.pool is not None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.pool is not None:
+            await self.flush()
+
+    async def _run(self) -> None:
+        last_prune = 0.0
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+            if loop.time() - last_prune >= 3600:
+                last_prune = loop.time()
+                await self.prune()
+
+    async def flush(self) -> None:
+        if not self._pending or self._inflight:
+            return
+        batch = self._inflight = self._pending
+        self._pending = {}
+        keys = list(batch)
+        written = False
+        try:
+            async with timed_acquire(self.pool, "alert_rollups") as conn:
+                await conn.execute(
+                    UPSERT_ROLLUPS_SQL,
+                    [k[0] for k in keys],
+                    [k[1] for k in keys],
+                    [k[2] for k in keys],
+                    [k[3] for k in keys],
+                    [batch[k] for k in keys],
+                )
+                written = True
+                self._inflight = {}
+            self.flushes += 1
+        except Exception as e:
+            self.flush_errors += 1
+            logger.warning("alert_rollups: flush of %d buckets failed: %s", len(keys), e)
+        finally:
+            self._inflight = {}
+            if not written:
+                # keep the deltas for the next attempt, up to max_pending buckets
+                for key, count in batch.items():
+                    if key in self._pending or len(self._pending) < self.max_pending:
+                        self._pending[key] = self._pending.get(key, 0) + count
+                    else:
+                        self.dropped += count
+
+    async def prune(self) -> None:
+        try:
+            async with timed_acquire(self.pool, "alert_rollups") as conn:
+                await conn.execute(PRUNE_MINUTES_SQL, self.minute_floor())
+        except Exception as e:
+            logger.warning("alert_rollups: pruning minute buckets failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "added": self.added,
+            "pending_buckets": len(self._pending),
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,197 @@
+"""Risk-tiered routing between the scorer and the LLM wizard.
+
+Most transactions are clear-cut. A LOW/ALLOW card payment from a local IP
+gains nothing from a model call. The routing policy decides, per request,
+how the wizard text is produced:
+
+- `template`   — deterministic wizard only (no LLM, no cache lookup)
+- `cache_only` — a cached LLM answer if one exists, otherwise the template
+- `cheap`      — the cheaper model (`models.cheap`)
+- `full`       — the full model (`models.full`)
+
+Policy document (JSON/YAML, like the rule documents):
+
+    {
+      "version": "2026-10-17",
+      "models": {"full": "gpt-4o", "cheap": "gpt-4o-mini"},
+      "routes": [
+        {"name": "clear_low", "when": {"risk_level": ["LOW"]}, "route": "template"},
+        {"name": "uncertain", "when": {"score_gte": 0.35, "score_lt": 0.8}, "route": "full"},
+        {"name": "default", "route": "cheap"}
+      ],
+      "overload": {"in_flight_gte": 16}
+    }
+
+Routes are checked in order and the first whose `when` matches wins; a
+route without `when` always matches. Conditions, all of which must hold:
+`risk_level`, `action` (lists), `rules_any`, `rules_all`, `rules_none`
+(lists of rule names) and `score_gte` / `score_lt` (the uncertainty band).
+When at least `overload.in_flight_gte` LLM calls are already running,
+the chosen route is stepped down one tier: full -> cheap -> cache_only.
+"""
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence
+import time
+
+TEMPLATE = "template"
+CACHE_ONLY = "cache_only"
+CHEAP = "cheap"
+FULL = "full"
+ROUTES = (TEMPLATE, CACHE_ONLY, CHEAP, FULL)
+
+_DOWNGRADE = {FULL: CHEAP, CHEAP: CACHE_ONLY, CACHE_ONLY: CACHE_ONLY, TEMPLATE: TEMPLATE}
+
+_CONDITIONS = ("risk_level", "action", "rules_any", "rules_all", "rules_none", "score_gte", "score_lt")
+
+DEFAULT_ROUTING_SPEC: Dict[str, Any] = {
+    "version": "builtin-1",
+    "routes": [
+        # obvious allows (e.g. local_ip_low_amount): the deterministic text is enough
+        {"name": "clear_low", "when": {"risk_level": ["LOW"]}, "route": TEMPLATE},
+        # borderline scores are where an analyst needs the best explanation
+        {"name": "uncertain_band", "when": {"score_gte": 0.35, "score_lt": 0.8}, "route": FULL},
+        {"name": "clear_high", "when": {"risk_level": ["HIGH"]}, "route": CHEAP},
+        {"name": "default", "route": FULL},
+    ],
+    "overload": {"in_flight_gte": 16},
+}
+
+
+class RoutingSpecError(ValueError):
+    """Raised when a routing policy document is invalid."""
+
+
+class Decision(NamedTuple):
+    route: str
+    rule: str
+    model: Optional[str]  # None for template / cache_only
+    downgraded: bool
+
+
+class _Route(NamedTuple):
+    name: str
+    route: str
+    risk_level: Optional[frozenset]
+    action: Optional[frozenset]
+    rules_any: Optional[frozenset]
+    rules_all: Optional[frozenset]
+    rules_none: Optional[frozenset]
+    score_gte: Optional[float]
+    score_lt: Optional[float]
+
+    def matches(self, score: float, risk_level: str, action: str, fired: frozenset) -> bool:
+        if self.risk_level is not None and risk_level not in self.risk_level:
+            return False
+        if self.action is not None and action not in self.action:
+            return False
+        if self.rules_any is not None and not (fired & self.rules_any):
+            return False
+        if self.rules_all is not None and not self.rules_all <= fired:
+            return False
+        if self.rules_none is not None and fired & self.rules_none:
+            return False
+        if self.score_gte is not None and score < self.score_gte:
+            return False
+        if self.score_lt is not None and score >= self.score_lt:
+            return False
+        return True
+
+
+def _names(value: Any, field: str, route: str, upper: bool = False) -> Optional[frozenset]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, (list, tuple)):
+        raise RoutingSpecError(f"route {route!r}: {field} must be a list")
+    return frozenset(str(v).upper() if upper else str(v) for v in value)
+
+
+class RoutingPolicy:
+    """Compiled routing document."""
+
+    def __init__(self, spec: Mapping[str, Any], full_model: str, cheap_model: str):
+        if not isinstance(spec, Mapping) or not isinstance(spec.get("routes"), list) or not spec["routes"]:
+            raise RoutingSpecError("routing document needs a non-empty 'routes' list")
+        self.spec = dict(spec)
+        self.version = str(spec.get("version") or "unversioned")
+        models = spec.get("models") or {}
+        self.models = {FULL: str(models.get(FULL) or full_model), CHEAP: str(models.get(CHEAP) or cheap_model)}
+        overload = spec.get("overload") or {}
+        self.overload_in_flight = int(overload.get("in_flight_gte") or 0)
+
+        self.routes: List[_Route] = []
+        for i, raw in enumerate(spec["routes"]):
+            name = str(raw.get("name") or f"route_{i}")
+            route = raw.get("route")
+            if route not in ROUTES:
+                raise RoutingSpecError(f"route {name!r}: route must be one of {', '.join(ROUTES)}")
+            when = raw.get("when") or {}
+            unknown = set(when) - set(_CONDITIONS)
+            if unknown:
+                raise RoutingSpecError(f"route {name!r}: unknown conditions {sorted(unknown)}")
+            self.routes.append(
+                _Route(
+                    name=name,
+                    route=route,
+                    risk_level=_names(when.get("risk_level"), "risk_level", name, upper=True),
+                    action=_names(when.get("action"), "action", name, upper=True),
+                    rules_any=_names(when.get("rules_any"), "rules_any", name),
+                    rules_all=_names(when.get("rules_all"), "rules_all", name),
+                    rules_none=_names(when.get("rules_none"), "rules_none", name),
+                    score_gte=None if when.get("score_gte") is None else float(when["score_gte"]),
+                    score_lt=None if when.get("score_lt") is None else float(when["score_lt"]),
+                )
+            )
+
+    def decide(
+        self, score: float, risk_level: str, action: str, rules_fired: Sequence[str], in_flight: int = 0
+    ) -> Decision:
+        fired = frozenset(rules_fired)
+        chosen = None
+        for r in self.routes:
+            if r.matches(score, risk_level, action, fired):
+                chosen = r
+                break
+        route, rule = (chosen.route, chosen.name) if chosen is not None else (FULL, "no_match")
+        downgraded = False
+        if self.overload_in_flight and in_flight >= self.overload_in_flight and _DOWNGRADE[route] != route:
+            route, downgraded = _DOWNGRADE[route], True
+        return Decision(route, rule, self.models.get(route), downgraded)
+
+
+class Router:
+    """Active routing policy plus per-route counters; reload swaps atomically."""
+
+    def __init__(self, spec: Mapping[str, Any], full_model: str, cheap_model: str, source: str = "builtin"):
+        self.full_model = full_model
+        self.cheap_model = cheap_model
+        self.active = RoutingPolicy(spec, full_model, cheap_model)
+        self.source = source
+        self.loaded_at = time.time()
+        self.reloads = 0
+        self.counts: Dict[str, int] = {}
+
+    def reload(self, spec: Mapping[str, Any], source: str) -> RoutingPolicy:
+        policy = RoutingPolicy(spec, self.full_model, self.cheap_model)  # raises before the swap
+        self.active = policy
+        self.source = source
+        self.loaded_at = time.time()
+        self.reloads += 1
+        return policy
+
+    def decide(self, score: float, risk_level: str, action: str, rules_fired: Sequence[str], in_flight: int = 0) -> Decision:
+        decision = self.active.decide(score, risk_level, action, rules_fired, in_flight)
+        self.counts[decision.route] = self.counts.get(decision.route, 0) + 1
+        return decision
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.active.version,
+            "source": self.source,
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            "models": self.active.models,
+            "overload_in_flight": self.active.overload_in_flight,
+            "routes": [{"name": r.name, "route": r.route} for r in self.active.routes],
+            "counts": dict(self.counts),
+        }
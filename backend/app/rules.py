@@ -0,0 +1,442 @@
+"""Declarative, compiled rule engine for the Fraud Wizard scorer.
+
+Rules live in a JSON/YAML document (file or the `integrations` table), so
+thresholds can change without a redeploy:
+
+    version: default-2
+    base_score: 0.5
+    thresholds: {high: 0.8, low: 0.2}
+    rules:
+      - name: amount_gt_5000
+        when: [{field: amount, op: gt, value: 5000}]
+        score: {set: 0.9}
+      - name: local_ip_low_amount
+        when:
+          - {field: ip_is_private, op: eq, value: true}
+          - {field: amount, op: lte, value: 100}
+        score: {min: 0.15}
+
+Score effects (`set`, `max`, `min`, `add`) are applied in document order.
+This is the same as the original hand-written if chain. Besides the
+transaction fields, conditions can read what the API adds: velocity
+counts (app/feature_store.py) and `ip_is_private`/`ip_asn`
+(app/ipintel.py).
+
+`compile_rules` turns a document into an evaluation plan:
+- Identical conditions are de-duplicated into one shared predicate table,
+  evaluated at most once per transaction (or once per column in a batch).
+- Conditions inside a rule are ordered cheapest first and short-circuit.
+- `evaluate_batch` runs the same plan over NumPy columns.
+
+`RuleEngine` holds the active plan. A reload compiles the new plan
+completely before swapping a single reference, so in-flight requests
+finish on the plan they started with.
+"""
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+import json
+import time
+
+import numpy as np
+
+DEFAULT_RULE_SPEC: Dict[str, Any] = {
+    "version": "default-2",
+    "base_score": 0.5,
+    "thresholds": {"high": 0.8, "low": 0.2},
+    "default_rule": "default_rule",
+    "rules": [
+        {
+            "name": "amount_gt_5000",
+            "when": [{"field": "amount", "op": "gt", "value": 5000}],
+            "score": {"set": 0.9},
+        },
+        {
+            "name": "high_velocity_24h",
+            "when": [{"field": "previous_tx_count_24h", "op": "gt", "value": 20}],
+            "score": {"max": 0.85},
+        },
+        {
+            "name": "local_ip_low_amount",
+            "when": [
+                {"field": "ip_is_private", "op": "eq", "value": True},
+                {"field": "amount", "op": "lte", "value": 100},
+            ],
+            "score": {"min": 0.15},
+        },
+    ],
+}
+
+NUMERIC_OPS = ("gt", "gte", "lt", "lte")
+OBJECT_OPS = ("eq", "ne", "in", "not_in", "startswith", "present", "absent")
+
+# Rough relative cost, used to order conditions inside a rule.
+_OP_COST = {"present": 0, "absent": 0, "gt": 1, "gte": 1, "lt": 1, "lte": 1, "eq": 2, "ne": 2, "in": 3, "not_in": 3, "startswith": 4}
+
+_EFFECTS = ("set", "max", "min", "add")
+
+
+class RuleSpecError(ValueError):
+    """Raised when a rule document cannot be compiled."""
+
+
+class Predicate(NamedTuple):
+    field: str
+    op: str
+    value: Any
+
+    @property
+    def cost(self) -> int:
+        return _OP_COST[self.op]
+
+    def scalar(self) -> Callable[[Any], bool]:
+        op, value = self.op, self.value
+        if op in NUMERIC_OPS:
+            cmp = {"gt": float.__gt__, "gte": float.__ge__, "lt": float.__lt__, "lte": float.__le__}[op]
+            threshold = float(value)
+
+            def check(x: Any) -> bool:
+                if x is None or isinstance(x, bool):
+                    return False
+                try:
+                    return cmp(float(x), threshold)
+                except (TypeError, ValueError):
+                    return False
+
+            return check
+        if op == "present":
+            return lambda x: bool(x)
+        if op == "absent":
+            return lambda x: not x
+        if op == "eq":
+            return lambda x: x is not None and x == value
+        if op == "ne":
+            return lambda x: x is not None and x != value
+        if op in ("in", "not_in"):
+            members = frozenset(value)
+            if op == "in":
+                return lambda x: x is not None and x in members
+            return lambda x: x is not None and x not in members
+        if op == "startswith":
+            prefixes = tuple(value) if isinstance(value, (list, tuple)) else (value,)
+            return lambda x: isinstance(x, str) and x.startswith(prefixes)
+        raise RuleSpecError(f"unknown op {op!r}")
+
+    def vector(self, column: np.ndarray) -> np.ndarray:
+        """Evaluate over a column (float64 with NaN for numeric ops, object otherwise)."""
+
+        if self.op in NUMERIC_OPS:
+            threshold = float(self.value)
+            with np.errstate(invalid="ignore"):
+                if self.op == "gt":
+                    return column > threshold
+                if self.op == "gte":
+                    return column >= threshold
+                if self.op == "lt":
+                    return column < threshold
+                return column <= threshold
+        check = self.scalar()
+        return np.fromiter((check(x) for x in column), dtype=bool, count=len(column))
+
+
+class CompiledRule(NamedTuple):
+    name: str
+    predicates: Tuple[int, ...]  # indices into the shared predicate table, cheapest first
+    effect: str
+    amount: float
+
+
+class BatchScores(NamedTuple):
+    scores: np.ndarray
+    risk_levels: np.ndarray
+    suggested_actions: np.ndarray
+    rules_fired: List[List[str]]
+
+    def row(self, i: int) -> Dict[str, Any]:
+        """One row as a ScoringResult-compatible dict."""
+
+        return {
+            "score": float(self.scores[i]),
+            "risk_level": self.risk_levels[i],
+            "suggested_action": self.suggested_actions[i],
+            "rules_fired": list(self.rules_fired[i]),
+        }
+
+
+_RISK_LEVELS = np.array(["LOW", "MEDIUM", "HIGH"], dtype=object)
+_ACTIONS = np.array(["ALLOW", "REVIEW", "BLOCK"], dtype=object)
+
+
+def _apply(effect: str, score: float, amount: float) -> float:
+    if effect == "set":
+        return amount
+    if effect == "max":
+        return max(score, amount)
+    if effect == "min":
+        return min(score, amount)
+    return score + amount
+
+
+def _apply_vector(effect: str, score: np.ndarray, mask: np.ndarray, amount: float) -> np.ndarray:
+    if effect == "set":
+        return np.where(mask, amount, score)
+    if effect == "max":
+        return np.where(mask, np.maximum(score, amount), score)
+    if effect == "min":
+        return np.where(mask, np.minimum(score, amount), score)
+    return np.where(mask, score + amount, score)
+
+
+def _coerce_float(x: Any) -> float:
+    if x is None or isinstance(x, bool):
+        return np.nan
+    try:
+        return float(x)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class CompiledRuleSet:
+    """An immutable evaluation plan plus its hit counters."""
+
+    def __init__(self, spec: Mapping[str, Any]):
+        self.spec = dict(spec)
+        self.version = str(spec.get("version") or "unversioned")
+        self.base_score = float(spec.get("base_score", 0.5))
+        thresholds = spec.get("thresholds") or {}
+        self.high = float(thresholds.get("high", 0.8))
+        self.low = float(thresholds.get("low", 0.2))
+        self.default_rule = spec.get("default_rule", "default_rule")
+
+        table: Dict[Predicate, int] = {}
+        costs: List[int] = []
+        rules: List[CompiledRule] = []
+        for raw in spec.get("rules") or []:
+            if not raw.get("enabled", True):
+                continue
+            name = raw.get("name")
+            if not name:
+                raise RuleSpecError("every rule needs a name")
+            conditions = raw.get("when") or []
+            if not conditions:
+                raise RuleSpecError(f"rule {name!r} has no conditions")
+            effect_spec = raw.get("score") or {}
+            if len(effect_spec) != 1 or next(iter(effect_spec)) not in _EFFECTS:
+                raise RuleSpecError(f"rule {name!r} needs exactly one score effect of {_EFFECTS}")
+            effect, amount = next(iter(effect_spec.items()))
+
+            indices = []
+            for cond in conditions:
+                op = cond.get("op")
+                if op not in _OP_COST:
+                    raise RuleSpecError(f"rule {name!r}: unknown op {op!r}")
+                value = cond.get("value")
+                if isinstance(value, list):
+                    value = tuple(value)
+                pred = Predicate(str(cond["field"]), op, value)
+                pred.scalar()  # validate eagerly
+                if pred not in table:
+                    table[pred] = len(table)
+                    costs.append(pred.cost)
+                indices.append(table[pred])
+            predicates = tuple(sorted(set(indices), key=lambda i: costs[i]))
+            rules.append(CompiledRule(str(name), predicates, effect, float(amount)))
+
+        self.predicates: List[Predicate] = list(table)
+        self._checks = [p.scalar() for p in self.predicates]
+        self.rules: Tuple[CompiledRule, ...] = tuple(rules)
+        self.rule_hits: Dict[str, int] = {r.name: 0 for r in self.rules}
+        self.evaluations = 0
+        self.eval_ns = 0
+        self._rules_by_code: Dict[int, List[str]] = {}
+
+    # -- levels -----------------------------------------------------------
+
+    def level_for(self, score: float) -> Tuple[str, str]:
+        if score >= self.high:
+            return "HIGH", "BLOCK"
+        if score <= self.low:
+            return "LOW", "ALLOW"
+        return "MEDIUM", "REVIEW"
+
+    # -- scalar path ------------------------------------------------------
+
+    def evaluate(self, features: Mapping[str, Any]) -> Dict[str, Any]:
+        """Score one transaction; returns a ScoringResult-compatible dict."""
+
+        started = time.perf_counter_ns()
+        memo: List[Optional[bool]] = [None] * len(self.predicates)
+        score = self.base_score
+        fired: List[str] = []
+        for rule in self.rules:
+            for i in rule.predicates:
+                hit = memo[i]
+                if hit is None:
+                    hit = memo[i] = self._checks[i](features.get(self.predicates[i].field))
+                if not hit:
+                    break
+            else:
+                score = _apply(rule.effect, score, rule.amount)
+                fired.append(rule.name)
+                self.rule_hits[rule.name] += 1
+        if not fired:
+            fired.append(self.default_rule)
+        risk_level, action = self.level_for(score)
+        self.evaluations += 1
+        self.eval_ns += time.perf_counter_ns() - started
+        return {
+            "score": float(score),
+            "risk_level": risk_level,
+            "suggested_action": action,
+            "rules_fired": fired,
+        }
+
+    # -- vectorized path --------------------------------------------------
+
+    def columns(self, rows: Sequence[Mapping[str, Any]]) -> Dict[Tuple[str, bool], np.ndarray]:
+        """Extract the columns this plan reads, keyed by (field, numeric)."""
+
+        n = len(rows)
+        out: Dict[Tuple[str, bool], np.ndarray] = {}
+        for pred in self.predicates:
+            numeric = pred.op in NUMERIC_OPS
+            key = (pred.field, numeric)
+            if key in out:
+                continue
+            if numeric:
+                out[key] = np.fromiter((_coerce_float(r.get(pred.field)) for r in rows), dtype=np.float64, count=n)
+            else:
+                col = np.empty(n, dtype=object)
+                col[:] = [r.get(pred.field) for r in rows]
+                out[key] = col
+        return out
+
+    def _rule_mask(
+        self, rule: CompiledRule, columns: Mapping[Tuple[str, bool], np.ndarray], masks: List[Optional[np.ndarray]], n: int
+    ) -> np.ndarray:
+        mask = np.ones(n, dtype=bool)
+        for i in rule.predicates:
+            if masks[i] is None:
+                pred = self.predicates[i]
+                masks[i] = pred.vector(columns[(pred.field, pred.op in NUMERIC_OPS)])
+            mask &= masks[i]
+            if not mask.any():
+                break
+        return mask
+
+    def evaluate_columns(self, columns: Mapping[Tuple[str, bool], np.ndarray], n: int) -> BatchScores:
+        started = time.perf_counter_ns()
+        masks: List[Optional[np.ndarray]] = [None] * len(self.predicates)
+        score = np.full(n, self.base_score)
+        fired = np.zeros((n, len(self.rules)), dtype=bool)
+        for j, rule in enumerate(self.rules):
+            mask = self._rule_mask(rule, columns, masks, n)
+            if not mask.any():
+                continue
+            score = _apply_vector(rule.effect, score, mask, rule.amount)
+            fired[:, j] = mask
+            self.rule_hits[rule.name] += int(mask.sum())
+
+        level = np.where(score >= self.high, 2, np.where(score <= self.low, 0, 1))
+        self.evaluations += n
+        self.eval_ns += time.perf_counter_ns() - started
+        return BatchScores(
+            scores=score,
+            risk_levels=_RISK_LEVELS[level],
+            suggested_actions=_ACTIONS[level],
+            rules_fired=self._rules_fired_lists(fired),
+        )
+
+    def evaluate_batch(self, rows: Sequence[Mapping[str, Any]]) -> BatchScores:
+        """Score many transactions column-wise; same results as `evaluate`."""
+
+        return self.evaluate_columns(self.columns(rows), len(rows))
+
+    def rule_deltas(self, rows: Sequence[Mapping[str, Any]]) -> np.ndarray:
+        """Score change made by each rule, (n_rows, n_rules).
+
+        Each row sums to `score - base_score`. Hit counters are not touched.
+        """
+
+        n = len(rows)
+        columns = self.columns(rows)
+        masks: List[Optional[np.ndarray]] = [None] * len(self.predicates)
+        score = np.full(n, self.base_score)
+        deltas = np.zeros((n, len(self.rules)))
+        for j, rule in enumerate(self.rules):
+            mask = self._rule_mask(rule, columns, masks, n)
+            if not mask.any():
+                continue
+            new = _apply_vector(rule.effect, score, mask, rule.amount)
+            deltas[:, j] = new - score
+            score = new
+        return deltas
+
+    def rule_fields(self) -> List[Tuple[str, ...]]:
+        """Distinct fields each rule reads, in rule order."""
+
+        return [tuple(dict.fromkeys(self.predicates[i].field for i in r.predicates)) for r in self.rules]
+
+    def _rules_fired_lists(self, fired: np.ndarray) -> List[List[str]]:
+        names = [r.name for r in self.rules]
+        if len(names) > 62:
+            return [[names[j] for j in np.flatnonzero(row)] or [self.default_rule] for row in fired]
+        codes = fired.astype(np.int64) @ (np.int64(1) << np.arange(len(names), dtype=np.int64))
+        out = []
+        for code in codes.tolist():
+            lst = self._rules_by_code.get(code)
+            if lst is None:
+                lst = [names[j] for j in range(len(names)) if code >> j & 1] or [self.default_rule]
+                self._rules_by_code[code] = lst
+            out.append(lst)
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "rules": len(self.rules),
+            "shared_predicates": len(self.predicates),
+            "evaluations": self.evaluations,
+            "avg_eval_us": round(self.eval_ns / self.evaluations / 1000.0, 3) if self.evaluations else 0.0,
+            "rule_hits": dict(self.rule_hits),
+        }
+
+
+def compile_rules(spec: Mapping[str, Any]) -> CompiledRuleSet:
+    return CompiledRuleSet(spec)
+
+
+def load_rule_spec(path: str) -> Dict[str, Any]:
+    """Read a rule document from a .json or .yaml/.yml file."""
+
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith((".yaml", ".yml")):
+        import yaml  # PyYAML, only needed for YAML rule files
+
+        return yaml.safe_load(text)
+    return json.loads(text)
+
+
+class RuleEngine:
+    """Holds the active compiled rule set and swaps it atomically on reload."""
+
+    def __init__(self, spec: Mapping[str, Any] = DEFAULT_RULE_SPEC, source: str = "builtin"):
+        self.active: CompiledRuleSet = compile_rules(spec)
+        self.source = source
+        self.loaded_at = time.time()
+        self.reloads = 0
+
+    def reload(self, spec: Mapping[str, Any], source: str) -> CompiledRuleSet:
+        compiled = compile_rules(spec)  # raises before anything is swapped
+        self.active = compiled
+        self.source = source
+        self.loaded_at = time.time()
+        self.reloads += 1
+        return compiled
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+            **self.active.stats(),
+        }
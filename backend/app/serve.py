@@ -0,0 +1,120 @@
+"""Multi-process launcher: uvicorn workers plus the shared state server.
+
+    python -m app.serve                    # one worker per usable core
+    SERVE_WORKERS=4 python -m app.serve
+
+- `SERVE_WORKERS` (`auto`): `auto` or 0 means one worker per usable core.
+  Usable cores are the CPU affinity mask capped by the cgroup v2 quota
+  (`cpu.max`), so a container limited to 2 CPUs gets 2 workers on a
+  64-core host.
+- `DB_CONNECTION_BUDGET` (20): total Postgres connections for the API.
+  When the alert stream uses LISTEN/NOTIFY, each worker keeps one
+  connection for it, so those are reserved first. Each worker's pool gets
+  `DB_POOL_MAX_SIZE` = what is left // workers (at least 1).
+- With more than one worker, a `StateServer` (app/shared_state.py) is
+  started on `SHARED_STATE_SOCKET` and the workers are pointed at it with
+  `SHARED_STATE_BACKEND=socket`. `ALERT_STREAM_SOURCE` defaults to
+  `notify`, because a worker's local broadcaster only sees the alerts it
+  wrote.
+
+Settings the operator set explicitly are kept. With one worker this is
+the same as `uvicorn app.main:app`.
+"""
+from typing import Dict, Mapping, Optional
+import math
+import multiprocessing
+import os
+import time
+
+from app.shared_state import run_server
+
+DEFAULT_SOCKET = "/tmp/fraud-wizard-state.sock"
+
+
+def usable_cpus() -> int:
+    try:
+        n = len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        n = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            n = min(n, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return n
+
+
+def worker_count(env: Mapping[str, str]) -> int:
+    raw = env.get("SERVE_WORKERS", "auto").strip().lower()
+    if raw in ("", "auto", "0"):
+        return usable_cpus()
+    return max(1, int(raw))
+
+
+def worker_env(workers: int, env: Mapping[str, str]) -> Dict[str, str]:
+    """Environment overrides every worker starts with."""
+
+    out: Dict[str, str] = {}
+    if workers > 1:
+        out["SHARED_STATE_BACKEND"] = env.get("SHARED_STATE_BACKEND", "socket")
+        out["SHARED_STATE_SOCKET"] = env.get("SHARED_STATE_SOCKET", DEFAULT_SOCKET)
+        out["ALERT_STREAM_SOURCE"] = env.get("ALERT_STREAM_SOURCE", "notify")
+    if "DB_POOL_MAX_SIZE" not in env:
+        budget = int(env.get("DB_CONNECTION_BUDGET", "20"))
+        source = out.get("ALERT_STREAM_SOURCE", env.get("ALERT_STREAM_SOURCE", "local")).lower()
+        reserved = workers if source == "notify" else 0  # one LISTEN connection per worker
+        per_worker = max(1, (budget - reserved) // workers)
+        out["DB_POOL_MAX_SIZE"] = str(per_worker)
+        out["DB_POOL_MIN_SIZE"] = str(min(int(env.get("DB_POOL_MIN_SIZE", "1")), per_worker))
+    return out
+
+
+def _start_state_server(path: str, timeout: float = 10.0) -> multiprocessing.Process:
+    # spawn: the server must not inherit anything from this process's imports
+    proc = multiprocessing.get_context("spawn").Process(target=run_server, args=(path,), name="fraud-wizard-state")
+    proc.start()
+    deadline = time.monotonic() + timeout
+    # serve_forever removes a stale socket before binding; wait for the new one
+    while time.monotonic() < deadline:
+        if os.path.exists(path) and proc.is_alive():
+            return proc
+        if not proc.is_alive():
+            break
+        time.sleep(0.05)
+    proc.terminate()
+    raise SystemExit(f"state server did not start on {path}")
+
+
+def run() -> None:
+    import uvicorn
+
+    workers = worker_count(os.environ)
+    overrides = worker_env(workers, os.environ)
+    os.environ.update(overrides)  # workers inherit the environment
+    host = os.environ.get("SERVE_HOST", "0.0.0.0")
+    port = int(os.environ.get("SERVE_PORT", "8000"))
+
+    state: Optional[multiprocessing.Process] = None
+    if os.environ.get("SHARED_STATE_BACKEND", "local") == "socket":
+        path = os.environ.setdefault("SHARED_STATE_SOCKET", DEFAULT_SOCKET)
+        if os.path.exists(path):
+            os.unlink(path)
+        state = _start_state_server(path)
+    print(
+        f"fraud-wizard: {workers} worker(s) on {host}:{port}, "
+        f"db pool {os.environ.get('DB_POOL_MIN_SIZE', '1')}-{os.environ.get('DB_POOL_MAX_SIZE', '5')} per worker, "
+        f"shared state {os.environ.get('SHARED_STATE_BACKEND', 'local')}",
+        flush=True,
+    )
+    try:
+        uvicorn.run("app.main:app", host=host, port=port, workers=workers)
+    finally:
+        if state is not None:
+            state.terminate()
+            state.join(5)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,379 @@
+"""Shadow scoring: run candidate rule sets and models against live traffic.
+
+A shadow candidate scores a sample of the transactions `/analyze` scores,
+but its result is never returned. Only disagreements are recorded. The
+config document (JSON or YAML) lists the candidates:
+
+    candidates:
+      - name: thresholds-v2
+        rules: rules-v2.yaml       # rule document (path or inline); default: the live rules
+      - name: gb-8
+        model: models/gb-8.npz     # app/ml_model.py format, blended with the candidate's rules
+        blend_weight: 0.6          # default 0.5
+
+Relative paths are resolved against the config file's directory.
+
+Candidates are compared with what `/analyze` returned, which is blended
+with the live model when one is loaded. A rules-only candidate is blended
+with that same live model score (and weight), so only the rule change
+shows up as a diff.
+
+The request path only calls `submit`: a sampling check and a `put_nowait`
+into a bounded queue. A background task takes batches off the queue and
+scores them with each candidate in a one-thread executor, using the
+vectorized rule and model paths. Shadow work is shed, never waited on:
+
+- not sampled (`sample_rate`)
+- the queue is full (`shed_full`)
+- a batch waited longer than `max_age` before it was scored, which means
+  the shadow worker is behind (`shed_stale`)
+
+A diff is a transaction whose risk level or action changed. Each diff
+becomes one `shadow_diffs` row. Every scored row also counts towards
+hourly per-candidate totals in `shadow_agreement` (compared, agreed,
+escalated, relaxed, ...). Both go through write-behind batch writers, so
+they never touch the request path either.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+
+import numpy as np
+
+from app.ml_model import feature_matrix, load_model
+from app.rules import CompiledRuleSet, compile_rules, load_rule_spec
+
+logger = logging.getLogger(__name__)
+
+# (candidate, transaction_id, primary_score, primary_risk_level, primary_action,
+#  shadow_score, shadow_risk_level, shadow_action, detail json, created_at)
+INSERT_SHADOW_DIFFS_SQL = (
+    "INSERT INTO shadow_diffs(candidate, transaction_id, primary_score, primary_risk_level, primary_action, "
+    "shadow_score, shadow_risk_level, shadow_action, detail, created_at) "
+    "SELECT * FROM unnest($1::text[], $2::text[], $3::float8[], $4::text[], $5::text[], "
+    "$6::float8[], $7::text[], $8::text[], $9::json[], $10::timestamptz[])"
+)
+
+# (candidate, bucket_start, compared, agreed, risk_level_changed, action_changed,
+#  escalated, relaxed, score_delta_sum). One flush can hold several rows for
+# the same key, so they are summed before the upsert.
+UPSERT_SHADOW_AGREEMENT_SQL = (
+    "INSERT INTO shadow_agreement(candidate, bucket_start, compared, agreed, risk_level_changed, "
+    "action_changed, escalated, relaxed, score_delta_sum) "
+    "SELECT candidate, bucket_start, sum(compared), sum(agreed), sum(risk_level_changed), "
+    "sum(action_changed), sum(escalated), sum(relaxed), sum(score_delta_sum) "
+    "FROM unnest($1::text[], $2::timestamptz[], $3::int8[], $4::int8[], $5::int8[], $6::int8[], "
+    "$7::int8[], $8::int8[], $9::float8[]) "
+    "AS r(candidate, bucket_start, compared, agreed, risk_level_changed, action_changed, escalated, relaxed, score_delta_sum) "
+    "GROUP BY candidate, bucket_start "
+    "ON CONFLICT (candidate, bucket_start) DO UPDATE SET "
+    "compared = shadow_agreement.compared + EXCLUDED.compared, "
+    "agreed = shadow_agreement.agreed + EXCLUDED.agreed, "
+    "risk_level_changed = shadow_agreement.risk_level_changed + EXCLUDED.risk_level_changed, "
+    "action_changed = shadow_agreement.action_changed + EXCLUDED.action_changed, "
+    "escalated = shadow_agreement.escalated + EXCLUDED.escalated, "
+    "relaxed = shadow_agreement.relaxed + EXCLUDED.relaxed, "
+    "score_delta_sum = shadow_agreement.score_delta_sum + EXCLUDED.score_delta_sum"
+)
+
+_ACTION_SEVERITY = {"ALLOW": 0, "REVIEW": 1, "BLOCK": 2}
+
+
+class Candidate(NamedTuple):
+    name: str
+    rules: Optional[CompiledRuleSet]  # None = score with the live rules
+    model: Any = None
+    blend_weight: float = 0.5
+
+
+class ShadowItem(NamedTuple):
+    features: Mapping[str, Any]
+    transaction_id: Optional[str]
+    score: float
+    rule_score: float  # the live rule score before any model blend
+    model_score: Optional[float]  # the live model's score when /analyze blended one in
+    risk_level: str
+    suggested_action: str
+    rules_fired: Sequence[str]
+    queued_at: float
+
+
+def load_candidates(path: str) -> List[Candidate]:
+    """Read a shadow config document and build its candidates (raises on any error)."""
+
+    spec = load_rule_spec(path)
+    base = os.path.dirname(os.path.abspath(path))
+
+    def resolve(p: str) -> str:
+        return p if os.path.isabs(p) else os.path.join(base, p)
+
+    candidates: List[Candidate] = []
+    for raw in (spec or {}).get("candidates") or []:
+        name = raw.get("name")
+        if not name:
+            raise ValueError("every shadow candidate needs a name")
+        rules = raw.get("rules")
+        if isinstance(rules, str):
+            rules = load_rule_spec(resolve(rules))
+        model = load_model(resolve(raw["model"])) if raw.get("model") else None
+        if rules is None and model is None:
+            raise ValueError(f"shadow candidate {name!r} needs rules, a model or both")
+        candidates.append(
+            Candidate(
+                name=str(name),
+                rules=compile_rules(rules) if rules is not None else None,
+                model=model,
+                blend_weight=min(1.0, max(0.0, float(raw.get("blend_weight", 0.5)))),
+            )
+        )
+    if len({c.name for c in candidates}) != len(candidates):
+        raise ValueError("shadow candidate names must be unique")
+    return candidates
+
+
+class _CandidateStats:
+    __slots__ = ("compared", "agreed", "risk_level_changed", "action_changed", "escalated", "relaxed", "score_delta_sum")
+
+    def __init__(self):
+        self.compared = 0
+        self.agreed = 0
+        self.risk_level_changed = 0
+        self.action_changed = 0
+        self.escalated = 0
+        self.relaxed = 0
+        self.score_delta_sum = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "compared": self.compared,
+            "agreed": self.agreed,
+            "agreement": round(self.agreed / self.compared, 6) if self.compared else None,
+            "risk_level_changed": self.risk_level_changed,
+            "action_changed": self.action_changed,
+            "escalated": self.escalated,
+            "relaxed": self.relaxed,
+            "avg_score_delta": round(self.score_delta_sum / self.compared, 6) if self.compared else None,
+        }
+
+
+class ShadowScorer:
+    """Samples scored transactions and compares candidates off the request path."""
+
+    def __init__(
+        self,
+        candidates: Sequence[Candidate],
+        live_rules: Callable[[], CompiledRuleSet],
+        sample_rate: float = 1.0,
+        max_queue: int = 10000,
+        batch_size: int = 256,
+        max_age: float = 5.0,
+        live_blend_weight: float = 0.5,
+    ):
+        self.candidates = list(candidates)
+        self.live_blend_weight = live_blend_weight
+        self.live_rules = live_rules
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.max_age = max_age
+        # set once the DB pool exists; without them only in-memory stats are kept
+        self.diff_writer = None
+        self.agreement_writer = None
+        self._queue: "asyncio.Queue[ShadowItem]" = asyncio.Queue(maxsize=max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._busy = False  # a batch is being scored or handed to the writers
+        self._stats = {c.name: _CandidateStats() for c in self.candidates}
+        self.offered = 0
+        self.sampled = 0
+        self.shed_full = 0
+        self.shed_stale = 0
+        self.batches = 0
+        self.errors = 0
+        self.score_ns = 0
+
+    def submit(
+        self,
+        features: Mapping[str, Any],
+        transaction_id: Optional[str],
+        score: float,
+        rule_score: float,
+        model_score: Optional[float],
+        risk_level: str,
+        suggested_action: str,
+        rules_fired: Sequence[str],
+    ) -> bool:
+        """Offer one scored transaction; never blocks. Returns True when queued."""
+
+        self.offered += 1
+        if self._task is None or self._closing or random.random() >= self.sample_rate:
+            return False
+        try:
+            self._queue.put_nowait(
+                ShadowItem(features, transaction_id, score, rule_score, model_score, risk_level,
+                           suggested_action, rules_fired, time.monotonic())
+            )
+        except asyncio.QueueFull:
+            self.shed_full += 1
+            return False
+        self.sampled += 1
+        return True
+
+    def start(self) -> None:
+        if self._task is None and self.candidates:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Stop sampling, score what is already queued (up to `timeout`), then stop.
+
+        Call it before the diff and agreement writers stop, so the rows
+        scored here still reach them.
+        """
+
+        if self._task is not None:
+            self._closing = True
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout
+            while (self._busy or not self._queue.empty()) and not self._task.done() and loop.time() < deadline:
+                await asyncio.sleep(0.01)
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=False)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            self._busy = True
+            try:
+                await self._score_and_submit(loop, batch)
+            finally:
+                self._busy = False
+
+    async def _score_and_submit(self, loop: asyncio.AbstractEventLoop, batch: List[ShadowItem]) -> None:
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        now = time.monotonic()
+        fresh = [item for item in batch if now - item.queued_at <= self.max_age]
+        self.shed_stale += len(batch) - len(fresh)
+        if not fresh:
+            return
+        try:
+            diffs, agreement = await loop.run_in_executor(self._executor, self._score_batch, fresh)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("shadow scoring failed for %d rows: %s", len(fresh), e)
+            return
+        if self.diff_writer is not None:
+            for row in diffs:
+                self.diff_writer.submit(row)
+        if self.agreement_writer is not None:
+            for row in agreement:
+                self.agreement_writer.submit(row)
+
+    def _score_batch(self, items: Sequence[ShadowItem]) -> Tuple[List[tuple], List[tuple]]:
+        """Score one batch with every candidate (runs in the shadow thread)."""
+
+        started = time.perf_counter_ns()
+        rows = [item.features for item in items]
+        now = datetime.now(timezone.utc)
+        bucket = now.replace(minute=0, second=0, microsecond=0)
+        live = self.live_rules()
+        primary_actions = [_ACTION_SEVERITY.get(i.suggested_action, 1) for i in items]
+        # live model scores (NaN where /analyze did not blend), for rules-only candidates
+        live_model = np.array(
+            [np.nan if i.model_score is None else i.model_score for i in items], dtype=np.float64
+        )
+        live_blended = ~np.isnan(live_model)
+        diffs: List[tuple] = []
+        agreement: List[tuple] = []
+        for cand in self.candidates:
+            levels_from = cand.rules or live
+            if cand.rules is not None:
+                result = cand.rules.evaluate_batch(rows)
+                rule_scores = result.scores
+                fired: Sequence[Sequence[str]] = result.rules_fired
+            else:
+                rule_scores = np.array([i.rule_score for i in items], dtype=np.float64)
+                fired = [i.rules_fired for i in items]
+            scores = rule_scores
+            if cand.model is not None:
+                p = cand.model.predict(feature_matrix(cand.model.features, rows))
+                scores = (1.0 - cand.blend_weight) * rule_scores + cand.blend_weight * p
+            elif live_blended.any():
+                w = self.live_blend_weight
+                scores = np.where(live_blended, (1.0 - w) * rule_scores + w * np.nan_to_num(live_model), rule_scores)
+            decided = [levels_from.level_for(s) for s in scores.tolist()]
+
+            st = self._stats[cand.name]
+            counts = [0, 0, 0, 0, 0, 0, 0.0]  # compared, agreed, level, action, escalated, relaxed, delta
+            for j, (item, (level, action)) in enumerate(zip(items, decided)):
+                score = float(scores[j])
+                level_changed = level != item.risk_level
+                action_changed = action != item.suggested_action
+                counts[0] += 1
+                counts[6] += score - item.score
+                if not (level_changed or action_changed):
+                    counts[1] += 1
+                    continue
+                counts[2] += int(level_changed)
+                counts[3] += int(action_changed)
+                severity = _ACTION_SEVERITY.get(action, 1)
+                counts[4] += int(severity > primary_actions[j])
+                counts[5] += int(severity < primary_actions[j])
+                diffs.append((
+                    cand.name,
+                    item.transaction_id,
+                    item.score,
+                    item.risk_level,
+                    item.suggested_action,
+                    score,
+                    level,
+                    action,
+                    json.dumps({
+                        "primary_rules_fired": list(item.rules_fired),
+                        "shadow_rules_fired": list(fired[j]),
+                        "rules_version": levels_from.version,
+                        "model_version": cand.model.version if cand.model is not None else None,
+                    }),
+                    now,
+                ))
+            st.compared += counts[0]
+            st.agreed += counts[1]
+            st.risk_level_changed += counts[2]
+            st.action_changed += counts[3]
+            st.escalated += counts[4]
+            st.relaxed += counts[5]
+            st.score_delta_sum += counts[6]
+            agreement.append((cand.name, bucket, *counts))
+        self.batches += 1
+        self.score_ns += time.perf_counter_ns() - started
+        return diffs, agreement
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sample_rate": self.sample_rate,
+            "queued": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "offered": self.offered,
+            "sampled": self.sampled,
+            "shed_full": self.shed_full,
+            "shed_stale": self.shed_stale,
+            "batches": self.batches,
+            "errors": self.errors,
+            "avg_batch_ms": round(self.score_ns / self.batches / 1e6, 3) if self.batches else 0.0,
+            "candidates": {name: st.as_dict() for name, st in self._stats.items()},
+        }
@@ -0,0 +1,752 @@
+"""State shared by the API worker processes (see app/serve.py).
+
+With one worker, every cache, velocity window and metric lives in that
+process. With several, each worker would warm its own copy, count a
+customer's velocity only from the requests it happened to receive, and
+answer `/metrics` with a fraction of the traffic. `StateBackend` is the
+extension point for where that state lives:
+
+- `LocalState` keeps it in-process. This is the default and is right for
+  one worker.
+- `SocketState` talks to a `StateServer` over a Unix socket. The launcher
+  starts one server next to the workers. It owns the velocity store, a
+  shared LRU+TTL cache (the second level of the wizard cache, like
+  `RedisCacheBackend`), the last metrics snapshot pushed by each worker,
+  async analyses (pending and finished, so `GET /analysis/{id}` works on
+  any worker), idempotency claims (so concurrent duplicates on two
+  workers are computed once) and config versions (so a reload on one
+  worker is repeated by the others).
+
+Frames are a 4-byte big-endian length followed by a JSON array:
+`[id, op, args]` for a request and `[id, result, error]` for the reply.
+Each worker keeps one connection and pipelines requests on it. Velocity
+observations made in the same event-loop tick are coalesced into one
+frame, so under load a worker sends a few large frames instead of one
+round trip per request. The server runs a single event loop, so its state
+needs no locks. Ops that wait (`analysis_wait`, `idempotency_claim`) run as
+their own tasks on the server, so they do not hold up the connection.
+
+Shared state is best-effort, like the cache layer. While the server is
+unreachable, velocity features are empty, shared cache lookups miss,
+`/metrics` shows the local worker only, analyses are only visible on the
+worker that accepted them (and in Postgres once finished), and duplicates
+are only coalesced within a worker. The client retries the connection
+after `reconnect_backoff` seconds.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+import asyncio
+import json
+import os
+import time
+
+from app.feature_store import VelocityStore
+from app.wizard_cache import CacheBackend
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+_HEADER = 4
+
+
+def _dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def _loads(raw: bytes) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+
+def _frame(obj: Any) -> bytes:
+    body = _dumps(obj)
+    return len(body).to_bytes(_HEADER, "big") + body
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Any:
+    header = await reader.readexactly(_HEADER)
+    return _loads(await reader.readexactly(int.from_bytes(header, "big")))
+
+
+class StateError(RuntimeError):
+    """Raised when the state server rejects a request."""
+
+
+class StateBackend:
+    """Where cross-worker state lives. `shared` is true when other workers see the same state."""
+
+    shared = False
+
+    async def velocity_observe(self, txs: Sequence[Mapping[str, Any]]) -> List[Dict[str, float]]:
+        """Velocity features before each transaction, then record it (in order)."""
+        raise NotImplementedError
+
+    async def velocity_warm_start(self, rows: Sequence[Tuple[Mapping[str, Any], float]]) -> int:
+        raise NotImplementedError
+
+    async def velocity_evict_idle(self) -> int:
+        raise NotImplementedError
+
+    async def velocity_stats(self) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    async def claim(self, name: str, ttl: float) -> bool:
+        """True for the first worker to claim `name` (one-off jobs such as warm start).
+
+        The claim lapses after `ttl` seconds unless `claim_finish` marks the
+        job done, so a worker that dies mid-job does not hold it forever.
+        """
+        raise NotImplementedError
+
+    async def claim_finish(self, name: str) -> None:
+        return None
+
+    def cache_backend(self) -> Optional[CacheBackend]:
+        """Second-level store for `WizardCache`, or None."""
+        return None
+
+    async def analysis_put(self, analysis_id: str, status: str, envelope: Dict[str, Any]) -> None:
+        """Publish an async analysis (pending or finished) to the other workers."""
+        return None
+
+    async def analysis_get(self, analysis_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """(status, envelope) of an analysis another worker published, or None."""
+        return None
+
+    async def analysis_wait(self, analysis_id: str, timeout: float) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Like `analysis_get`, but waits up to `timeout` seconds for a pending one to finish."""
+        return None
+
+    async def idempotency_claim(
+        self, key: str, request_hash: str, wait: float
+    ) -> Tuple[bool, Optional[Tuple[str, Dict[str, Any]]]]:
+        """(holds the claim, stored (request hash, envelope)) for `key`.
+
+        The first worker gets the claim for up to `wait` seconds and should
+        compute, then call `idempotency_finish` or `idempotency_release`.
+        Others wait for its result, up to `wait`. (False, None) means
+        compute without a claim.
+        """
+        return False, None
+
+    async def idempotency_finish(self, key: str, request_hash: str, envelope: Dict[str, Any], ttl: float) -> None:
+        return None
+
+    async def idempotency_release(self, key: str) -> None:
+        return None
+
+    async def config_publish(self, name: str, payload: Any = None) -> int:
+        """Announce a config change to the other workers; returns its version (0: nobody to tell)."""
+        return 0
+
+    async def config_versions(self) -> Dict[str, Tuple[int, Any]]:
+        """name -> (latest version, payload) for every published config."""
+        return {}
+
+    async def metrics_push(self, worker: str, snapshot: Dict[str, Any]) -> None:
+        return None
+
+    async def metrics_pull(self) -> Dict[str, Dict[str, Any]]:
+        return {}
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__, "pid": os.getpid()}
+
+    async def close(self) -> None:
+        return None
+
+
+class LocalState(StateBackend):
+    """Everything in this process (one worker)."""
+
+    def __init__(self, velocity: Optional[VelocityStore]):
+        self.velocity = velocity
+
+    async def velocity_observe(self, txs: Sequence[Mapping[str, Any]]) -> List[Dict[str, float]]:
+        if self.velocity is None:
+            return [{} for _ in txs]
+        return [self.velocity.observe(tx) for tx in txs]
+
+    async def velocity_warm_start(self, rows: Sequence[Tuple[Mapping[str, Any], float]]) -> int:
+        return self.velocity.warm_start(rows) if self.velocity is not None else 0
+
+    async def velocity_evict_idle(self) -> int:
+        return self.velocity.evict_idle() if self.velocity is not None else 0
+
+    async def velocity_stats(self) -> Optional[Dict[str, Any]]:
+        return self.velocity.stats() if self.velocity is not None else None
+
+    async def claim(self, name: str, ttl: float) -> bool:
+        return True
+
+
+# -------------------------
+# Server (one per host, started by the launcher)
+# -------------------------
+class _TTLCache:
+    """LRU with per-entry expiry; values are opaque."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {"size": len(self._entries), "maxsize": self.maxsize, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions}
+
+
+class StateServer:
+    """Unix-socket server holding the velocity store, shared cache and metric snapshots."""
+
+    def __init__(
+        self,
+        path: str,
+        velocity: Optional[VelocityStore] = None,
+        cache_maxsize: int = 100000,
+        metrics_max_age: float = 30.0,
+        analysis_max: int = 10000,
+        analysis_pending_ttl: float = 900.0,
+        idempotency_maxsize: int = 20000,
+    ):
+        self.path = path
+        self.velocity = velocity
+        self.cache = _TTLCache(cache_maxsize)
+        self.metrics_max_age = metrics_max_age
+        self._metrics: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        # one-off job claims: name -> expires at (None once the job is done)
+        self._claims: Dict[str, Optional[float]] = {}
+        # analysis id -> [status, envelope json, put at]; finished ones are evicted oldest
+        # first, pending ones once they are older than analysis_pending_ttl
+        self.analysis_max = analysis_max
+        self.analysis_pending_ttl = analysis_pending_ttl
+        self._analyses: "OrderedDict[str, List[Any]]" = OrderedDict()
+        self._analysis_done: Dict[str, asyncio.Event] = {}
+        # finished idempotent requests: key -> [request hash, envelope json]
+        self.idempotency = _TTLCache(idempotency_maxsize)
+        # in-flight idempotency claims: key -> (expires at, set when released or finished)
+        self._leases: Dict[str, Tuple[float, asyncio.Event]] = {}
+        # published config changes: name -> [version, payload]; versions only grow
+        self._configs: Dict[str, List[Any]] = {}
+        self._config_version = 0
+        self._ops = {
+            "hello": self._hello,
+            "velocity_observe": self._velocity_observe,
+            "velocity_warm_start": self._velocity_warm_start,
+            "velocity_evict_idle": lambda: self.velocity.evict_idle() if self.velocity is not None else 0,
+            "velocity_stats": lambda: self.velocity.stats() if self.velocity is not None else None,
+            "claim": self._claim,
+            "claim_finish": self._claim_finish,
+            "cache_get": self.cache.get,
+            "cache_set": self.cache.set,
+            "analysis_put": self._analysis_put,
+            "analysis_get": self._analysis_get,
+            "analysis_wait": self._analysis_wait,
+            "idempotency_claim": self._idempotency_claim,
+            "idempotency_finish": self._idempotency_finish,
+            "idempotency_release": self._idempotency_release,
+            "config_publish": self._config_publish,
+            "config_versions": lambda: self._configs,
+            "metrics_push": self._metrics_push,
+            "metrics_pull": self._metrics_pull,
+            "stats": self.stats,
+        }
+        self.started_at = time.time()
+        self.connections = 0
+        self.requests = 0
+        self.errors = 0
+
+    def _hello(self) -> Dict[str, Any]:
+        return {
+            "velocity_dimensions": list(self.velocity.dimensions) if self.velocity is not None else None,
+            "velocity_features": list(self.velocity.feature_names) if self.velocity is not None else None,
+        }
+
+    def _rows(self, rows: List[List[Any]]):
+        # [dimension values..., amount, ts] -> (tx, ts)
+        dims = self.velocity.dimensions
+        for row in rows:
+            tx = dict(zip(dims, row))
+            tx["amount"] = row[-2]
+            yield tx, row[-1]
+
+    def _velocity_observe(self, rows: List[List[Any]]) -> List[List[float]]:
+        names = self.velocity.feature_names
+        out = []
+        for tx, ts in self._rows(rows):
+            features = self.velocity.observe(tx, ts)
+            out.append([features[n] for n in names])
+        return out
+
+    def _velocity_warm_start(self, rows: List[List[Any]]) -> int:
+        return self.velocity.warm_start(self._rows(rows))
+
+    def _claim(self, name: str, ttl: float) -> bool:
+        now = time.monotonic()
+        if name in self._claims:
+            expires = self._claims[name]
+            if expires is None or expires > now:
+                return False
+        self._claims[name] = now + ttl
+        return True
+
+    def _claim_finish(self, name: str) -> None:
+        self._claims[name] = None
+
+    def _analysis_put(self, analysis_id: str, status: str, envelope: str) -> None:
+        self._analyses[analysis_id] = [status, envelope, time.monotonic()]
+        self._analyses.move_to_end(analysis_id)
+        if status != "pending":
+            self._wake_analysis(analysis_id)
+        if len(self._analyses) > self.analysis_max:
+            self._evict_analyses()
+
+    def _wake_analysis(self, analysis_id: str) -> None:
+        done = self._analysis_done.pop(analysis_id, None)
+        if done is not None:
+            done.set()
+
+    def _evict_analyses(self) -> int:
+        """Drop stale pending entries (their worker died), then finished ones oldest first."""
+
+        evicted = 0
+        stale = time.monotonic() - self.analysis_pending_ttl
+        for key, (status, _, put_at) in list(self._analyses.items()):
+            if status == "pending" and put_at < stale:
+                del self._analyses[key]
+                self._wake_analysis(key)
+                evicted += 1
+        for key in list(self._analyses):
+            if len(self._analyses) <= self.analysis_max:
+                break
+            if self._analyses[key][0] != "pending":
+                del self._analyses[key]
+                self._wake_analysis(key)
+                evicted += 1
+        return evicted
+
+    def _analysis_get(self, analysis_id: str) -> Optional[List[Any]]:
+        return self._analyses.get(analysis_id)
+
+    async def _analysis_wait(self, analysis_id: str, timeout: float) -> Optional[List[Any]]:
+        entry = self._analyses.get(analysis_id)
+        if entry is None or entry[0] != "pending":
+            return entry
+        done = self._analysis_done.setdefault(analysis_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._analyses.get(analysis_id)
+
+    async def _idempotency_claim(self, key: str, request_hash: str, wait: float) -> List[Any]:
+        """["lead"], ["done", request hash, envelope json] or ["busy"] (holder still running after `wait`)."""
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while True:
+            stored = self.idempotency.get(key)
+            if stored is not None:
+                return ["done", *stored]
+            now = loop.time()
+            lease = self._leases.get(key)
+            if lease is None or lease[0] <= now:
+                # free, or the holder's worker died without releasing it
+                self._leases[key] = (now + wait, asyncio.Event())
+                return ["lead"]
+            if now >= deadline:
+                return ["busy"]
+            try:
+                await asyncio.wait_for(lease[1].wait(), min(deadline, lease[0]) - now)
+            except asyncio.TimeoutError:
+                pass
+
+    def _idempotency_finish(self, key: str, request_hash: str, envelope: str, ttl: float) -> None:
+        self.idempotency.set(key, [request_hash, envelope], ttl)
+        self._idempotency_release(key)
+
+    def _idempotency_release(self, key: str) -> None:
+        lease = self._leases.pop(key, None)
+        if lease is not None:
+            lease[1].set()
+
+    def _config_publish(self, name: str, payload: Any) -> int:
+        self._config_version += 1
+        self._configs[name] = [self._config_version, payload]
+        return self._config_version
+
+    def _metrics_push(self, worker: str, snapshot: Dict[str, Any]) -> None:
+        self._metrics[worker] = (time.monotonic(), snapshot)
+
+    def _metrics_pull(self) -> Dict[str, Dict[str, Any]]:
+        cutoff = time.monotonic() - self.metrics_max_age
+        for worker in [w for w, (at, _) in self._metrics.items() if at < cutoff]:
+            del self._metrics[worker]  # worker exited or stopped pushing
+        return {worker: snap for worker, (_, snap) in self._metrics.items()}
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        waiting: set = set()
+        try:
+            while True:
+                req_id, op, args = await _read_frame(reader)
+                self.requests += 1
+                try:
+                    result = self._ops[op](*args)
+                    if asyncio.iscoroutine(result):
+                        # a waiting op: reply when it is done, keep serving this connection
+                        task = asyncio.create_task(self._reply_later(writer, req_id, result))
+                        waiting.add(task)
+                        task.add_done_callback(waiting.discard)
+                        continue
+                    reply = [req_id, result, None]
+                except Exception as e:
+                    self.errors += 1
+                    reply = [req_id, None, f"{type(e).__name__}: {e}"]
+                writer.write(_frame(reply))
+                if writer.transport.get_write_buffer_size() > 1 << 20:
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass  # client went away, or sent something that is not a frame
+        finally:
+            for task in waiting:
+                task.cancel()
+            self.connections -= 1
+            writer.close()
+
+    async def _reply_later(self, writer: asyncio.StreamWriter, req_id: int, pending) -> None:
+        try:
+            reply = [req_id, await pending, None]
+        except Exception as e:
+            self.errors += 1
+            reply = [req_id, None, f"{type(e).__name__}: {e}"]
+        if not writer.is_closing():
+            writer.write(_frame(reply))
+
+    async def serve_forever(self, sweep_interval: float = 60.0) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # left over from a previous run
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        os.chmod(self.path, 0o600)
+        sweeper = asyncio.create_task(self._sweep(sweep_interval))
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            sweeper.cancel()
+
+    async def _sweep(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            if self.velocity is not None:
+                self.velocity.evict_idle()
+            self._evict_analyses()
+            # leases whose worker died without releasing them and nobody asked for since
+            now = asyncio.get_running_loop().time()
+            for key, (expires, released) in list(self._leases.items()):
+                if expires <= now:
+                    del self._leases[key]
+                    released.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "uptime_s": round(time.time() - self.started_at, 3),
+            "connections": self.connections,
+            "requests": self.requests,
+            "errors": self.errors,
+            "cache": self.cache.stats(),
+            "analyses": len(self._analyses),
+            "analyses_pending": sum(1 for entry in self._analyses.values() if entry[0] == "pending"),
+            "idempotency": self.idempotency.stats(),
+            "idempotency_in_flight": len(self._leases),
+            "claims": sorted(self._claims),
+            "config_versions": {name: entry[0] for name, entry in self._configs.items()},
+            "metrics_workers": len(self._metrics),
+        }
+
+
+def run_server(path: str) -> None:
+    """Process entry point. Reads the same VELOCITY_*, ANALYSIS_* and IDEMPOTENCY_MAXSIZE settings as the API."""
+
+    velocity = None
+    if os.environ.get("VELOCITY_ENABLED", "true").lower() in ("1", "true", "yes", "on"):
+        velocity = VelocityStore(max_keys=int(os.environ.get("VELOCITY_MAX_KEYS", "100000")))
+    server = StateServer(
+        path,
+        velocity=velocity,
+        cache_maxsize=int(os.environ.get("SHARED_STATE_CACHE_MAXSIZE", "100000")),
+        metrics_max_age=float(os.environ.get("SHARED_STATE_METRICS_MAX_AGE", "30")),
+        analysis_max=int(os.environ.get("ANALYSIS_STORE_MAX", "10000")),
+        analysis_pending_ttl=float(os.environ.get("ANALYSIS_PENDING_TTL", "900")),
+        idempotency_maxsize=int(os.environ.get("IDEMPOTENCY_MAXSIZE", "20000")),
+    )
+    try:
+        asyncio.run(server.serve_forever(float(os.environ.get("VELOCITY_SWEEP_INTERVAL", "60"))))
+    except KeyboardInterrupt:
+        pass
+
+
+# -------------------------
+# Client (one per worker)
+# -------------------------
+class SocketState(StateBackend):
+    """`StateBackend` backed by a `StateServer` on a Unix socket."""
+
+    shared = True
+
+    def __init__(self, path: str, timeout: float = 0.5, reconnect_backoff: float = 1.0):
+        self.path = path
+        self.timeout = timeout
+        self.reconnect_backoff = reconnect_backoff
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._down_until = 0.0
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._next_id = 0
+        self._observe_queue: List[Tuple[List[Any], asyncio.Future]] = []
+        self.velocity_dimensions: Optional[Tuple[str, ...]] = None
+        self.velocity_features: Optional[Tuple[str, ...]] = None
+        self.requests = 0
+        self.errors = 0
+        self.connects = 0
+        self.observe_frames = 0
+        self.observe_rows = 0
+
+    async def _ensure(self) -> None:
+        if self._writer is not None:
+            return
+        if time.monotonic() < self._down_until:
+            raise ConnectionError("state server unavailable")
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None:
+                return
+            try:
+                reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(self.path), self.timeout)
+                self._writer = writer
+                self._reader_task = asyncio.create_task(self._read_loop(reader))
+                hello = await asyncio.wait_for(self._send("hello", []), self.timeout)
+            except Exception:
+                self._down_until = time.monotonic() + self.reconnect_backoff
+                self._disconnect(ConnectionError("state server unavailable"))
+                raise
+            dims, names = hello["velocity_dimensions"], hello["velocity_features"]
+            self.velocity_dimensions = tuple(dims) if dims is not None else None
+            self.velocity_features = tuple(names) if names is not None else None
+            self.connects += 1
+
+    async def _read_loop(self, reader: asyncio.StreamReader) -> None:
+        error: Exception = ConnectionError("state server closed the connection")
+        try:
+            while True:
+                req_id, result, message = await _read_frame(reader)
+                fut = self._pending.pop(req_id, None)
+                if fut is None or fut.done():
+                    continue
+                if message is None:
+                    fut.set_result(result)
+                else:
+                    fut.set_exception(StateError(message))
+        except Exception as e:
+            if not isinstance(e, asyncio.IncompleteReadError):
+                error = e
+        finally:
+            self._disconnect(error)
+
+    def _disconnect(self, error: Exception) -> None:
+        writer, self._writer = self._writer, None
+        if writer is not None:
+            writer.close()
+        pending, self._pending = self._pending, {}
+        for fut in pending.values():
+            if not fut.done():
+                fut.set_exception(error)
+        self.velocity_dimensions = self.velocity_features = None
+
+    def _send(self, op: str, args: List[Any]) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        if self._writer is None:
+            fut.set_exception(ConnectionError("state server unavailable"))
+            return fut
+        self._next_id += 1
+        self._pending[self._next_id] = fut
+        self._writer.write(_frame([self._next_id, op, args]))
+        self.requests += 1
+        return fut
+
+    async def call(self, op: str, *args: Any, wait: float = 0.0) -> Any:
+        """Run one server op and return its result (raises on timeout or a server error).
+
+        `wait` is added to the timeout for ops that wait on the server.
+        """
+
+        await self._ensure()
+        try:
+            return await asyncio.wait_for(self._send(op, list(args)), self.timeout + wait)
+        except Exception:
+            self.errors += 1
+            raise
+
+    async def velocity_observe(self, txs: Sequence[Mapping[str, Any]]) -> List[Dict[str, float]]:
+        await self._ensure()
+        if self.velocity_dimensions is None:
+            return [{} for _ in txs]  # velocity is disabled on the server
+        dims, ts = self.velocity_dimensions, time.time()
+        rows = [[tx.get(d) for d in dims] + [tx.get("amount"), ts] for tx in txs]
+        fut = asyncio.get_running_loop().create_future()
+        if not self._observe_queue:
+            asyncio.get_running_loop().call_soon(self._flush_observe)
+        self._observe_queue.append((rows, fut))
+        names = self.velocity_features
+        try:
+            values = await asyncio.wait_for(fut, self.timeout)
+        except Exception:
+            self.errors += 1
+            raise
+        return [dict(zip(names, v)) for v in values]
+
+    def _flush_observe(self) -> None:
+        """Send every observation queued during this loop tick as one frame."""
+
+        queue, self._observe_queue = self._observe_queue, []
+        rows = [row for batch, _ in queue for row in batch]
+        self.observe_frames += 1
+        self.observe_rows += len(rows)
+        sent = self._send("velocity_observe", [rows])
+
+        def _split(done: asyncio.Future) -> None:
+            error = ConnectionError("state request cancelled") if done.cancelled() else done.exception()
+            offset = 0
+            for batch, fut in queue:
+                if not fut.done():  # a caller that timed out has cancelled its future
+                    if error is not None:
+                        fut.set_exception(error)
+                    else:
+                        fut.set_result(done.result()[offset:offset + len(batch)])
+                offset += len(batch)
+
+        sent.add_done_callback(_split)
+
+    async def velocity_warm_start(self, rows: Sequence[Tuple[Mapping[str, Any], float]]) -> int:
+        await self._ensure()
+        if self.velocity_dimensions is None:
+            return 0
+        dims = self.velocity_dimensions
+        return await self.call(
+            "velocity_warm_start", [[tx.get(d) for d in dims] + [tx.get("amount"), ts] for tx, ts in rows]
+        )
+
+    async def velocity_evict_idle(self) -> int:
+        return await self.call("velocity_evict_idle")
+
+    async def velocity_stats(self) -> Optional[Dict[str, Any]]:
+        return await self.call("velocity_stats")
+
+    async def claim(self, name: str, ttl: float) -> bool:
+        return await self.call("claim", name, ttl)
+
+    async def claim_finish(self, name: str) -> None:
+        await self.call("claim_finish", name)
+
+    def cache_backend(self) -> Optional[CacheBackend]:
+        return SharedCacheBackend(self)
+
+    async def analysis_put(self, analysis_id: str, status: str, envelope: Dict[str, Any]) -> None:
+        # envelopes go over as JSON text; the server never looks inside them
+        await self.call("analysis_put", analysis_id, status, json.dumps(envelope, default=str))
+
+    async def analysis_get(self, analysis_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        entry = await self.call("analysis_get", analysis_id)
+        return (entry[0], json.loads(entry[1])) if entry is not None else None
+
+    async def analysis_wait(self, analysis_id: str, timeout: float) -> Optional[Tuple[str, Dict[str, Any]]]:
+        entry = await self.call("analysis_wait", analysis_id, timeout, wait=timeout)
+        return (entry[0], json.loads(entry[1])) if entry is not None else None
+
+    async def idempotency_claim(
+        self, key: str, request_hash: str, wait: float
+    ) -> Tuple[bool, Optional[Tuple[str, Dict[str, Any]]]]:
+        reply = await self.call("idempotency_claim", key, request_hash, wait, wait=wait)
+        if reply[0] == "lead":
+            return True, None
+        if reply[0] == "done":
+            return False, (reply[1], json.loads(reply[2]))
+        return False, None  # the holder is still running: compute here rather than wait longer
+
+    async def idempotency_finish(self, key: str, request_hash: str, envelope: Dict[str, Any], ttl: float) -> None:
+        await self.call("idempotency_finish", key, request_hash, json.dumps(envelope, default=str), ttl)
+
+    async def idempotency_release(self, key: str) -> None:
+        await self.call("idempotency_release", key)
+
+    async def config_publish(self, name: str, payload: Any = None) -> int:
+        return await self.call("config_publish", name, payload)
+
+    async def config_versions(self) -> Dict[str, Tuple[int, Any]]:
+        return {name: (entry[0], entry[1]) for name, entry in (await self.call("config_versions")).items()}
+
+    async def metrics_push(self, worker: str, snapshot: Dict[str, Any]) -> None:
+        await self.call("metrics_push", worker, snapshot)
+
+    async def metrics_pull(self) -> Dict[str, Dict[str, Any]]:
+        return await self.call("metrics_pull")
+
+    async def server_stats(self) -> Dict[str, Any]:
+        return await self.call("stats")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "path": self.path,
+            "connected": self._writer is not None,
+            "connects": self.connects,
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": len(self._pending),
+            "avg_observe_rows_per_frame": round(self.observe_rows / self.observe_frames, 3) if self.observe_frames else 0.0,
+        }
+
+    async def close(self) -> None:
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+        self._disconnect(ConnectionError("state client closed"))
+
+
+class SharedCacheBackend(CacheBackend):
+    """`WizardCache` second level in the state server (the shared equivalent of `RedisCacheBackend`)."""
+
+    def __init__(self, state: SocketState, prefix: str = "wizard:"):
+        self._state = state
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self._state.call("cache_get", self._prefix + key)
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await self._state.call("cache_set", self._prefix + key, value, ttl)
@@ -0,0 +1,339 @@
+"""Fingerprint-keyed cache for Fraud Wizard LLM reasoning and wizard steps.
+
+Most /analyze traffic produces the same scoring outcome (same rules, risk
+level and action) with only the amount or country changing. Paying for a
+full chat completion on each of those is wasteful, so the LLM answer is
+stored as a *template*: transaction-specific values (amount, currency,
+country, ids) are replaced with `{{name}}` markers before caching and
+filled back in from the current transaction on a hit. Amounts are only
+replaced where they stand next to a currency, and keep the number format
+the LLM used. Ids are only replaced when they are distinctive enough not
+to match ordinary words and numbers; an answer that mentions a short id
+such as customer "1" is not cached at all.
+
+Keys are a hash of the normalized scoring result plus a configurable set
+of bucketed transaction fields, e.g. `amount:log,ip_country,channel`.
+
+The local layer is an LRU with TTL and a size cap. An optional shared
+backend (Redis or any `CacheBackend`) lets several workers share entries.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import math
+import re
+import time
+
+
+# Transaction fields whose values are swapped for markers in cached text.
+TEMPLATE_FIELDS: Tuple[str, ...] = (
+    "transaction_id",
+    "customer_id",
+    "merchant",
+    "ip_address",
+    "ip_country",
+    "currency",
+    "amount",
+)
+
+# Ids shorter than this, or all digits and shorter than the numeric minimum,
+# would also match unrelated text ("1 saat içinde 5 işlem").
+ID_FIELDS: Tuple[str, ...] = ("transaction_id", "customer_id", "merchant")
+MIN_ID_LENGTH = 4
+MIN_NUMERIC_ID_LENGTH = 6
+
+
+class CacheBackend:
+    """Shared second-level store. Implementations must be best-effort."""
+
+    async def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        return None
+
+
+class RedisCacheBackend(CacheBackend):
+    """Redis-backed shared cache (needs the optional `redis` package)."""
+
+    def __init__(self, url: str, prefix: str = "wizard:"):
+        import redis.asyncio as redis_asyncio  # optional dependency
+
+        self._redis = redis_asyncio.from_url(url)
+        self._prefix = prefix
+
+    async def get(self, key: str) -> Optional[str]:
+        raw = await self._redis.get(self._prefix + key)
+        if raw is None:
+            return None
+        return raw.decode("utf-8") if isinstance(raw, bytes) else raw
+
+    async def set(self, key: str, value: str, ttl: float) -> None:
+        await self._redis.set(self._prefix + key, value, ex=max(int(ttl), 1))
+
+    async def close(self) -> None:
+        await self._redis.close()
+
+
+def parse_key_fields(spec: str) -> List[Tuple[str, str]]:
+    """Parse `amount:log,ip_country,amount:step=500` into (field, bucket) pairs."""
+
+    out: List[Tuple[str, str]] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        field, _, bucket = part.partition(":")
+        out.append((field.strip(), bucket.strip() or "exact"))
+    return out
+
+
+def bucket_value(value: Any, bucket: str) -> Any:
+    """Map a raw field value to its cache-key bucket."""
+
+    if value is None:
+        return None
+    if bucket == "present":
+        return bool(value)
+    if bucket == "log":
+        try:
+            x = abs(float(value))
+        except (TypeError, ValueError):
+            return None
+        return -1 if x < 1 else int(math.floor(math.log10(x)))
+    if bucket.startswith("step="):
+        try:
+            return int(math.floor(float(value) / float(bucket[5:])))
+        except (TypeError, ValueError, ZeroDivisionError):
+            return None
+    return str(value).strip().lower()
+
+
+# Amounts are only templated next to a currency code, the `{{currency}}`
+# marker or one of these symbols. A bare "5" is as likely to be a count or
+# a step number ("Adım 1 / 5") as the amount.
+_CURRENCY_SYMBOLS = "$€£¥₺₹"
+
+_MARKER = re.compile(r"\{\{(\w+)(?::([^{}]*))?\}\}")
+
+
+def _amount_forms(value: Any) -> List[Tuple[str, str]]:
+    """(spelling, marker) pairs for the ways the LLM is likely to have written the amount.
+
+    The marker keeps the spelling's format, so "9,000.00" becomes
+    `{{amount:,.2f}}` and is filled as "1,250.00" for the next transaction.
+    """
+
+    try:
+        x = float(value)
+    except (TypeError, ValueError):
+        return [(str(value), "{{amount}}")]
+    forms = {str(value): "{{amount}}", repr(x): "{{amount}}", f"{x:.2f}": "{{amount:.2f}}"}
+    # below 1000 the grouped spellings are the same strings; keep the plain formats then
+    forms.setdefault(f"{x:,.2f}", "{{amount:,.2f}}")
+    if x.is_integer():
+        forms.setdefault(str(int(x)), "{{amount}}")
+        forms.setdefault(f"{int(x):,}", "{{amount:,}}")
+    return sorted(forms.items(), key=lambda item: len(item[0]), reverse=True)
+
+
+def format_amount(value: Any, spec: Optional[str] = None) -> str:
+    """Render an amount for a `{{amount[:spec]}}` marker.
+
+    No spec means the transaction's own spelling: whole amounts without a
+    trailing ".0", others as given.
+    """
+
+    try:
+        x = float(value)
+    except (TypeError, ValueError):
+        return str(value)
+    if spec in (".2f", ",.2f"):
+        return format(x, spec)
+    if spec == ",":
+        return f"{int(x):,}" if x.is_integer() else f"{x:,.2f}"
+    if isinstance(value, str):
+        return value
+    return str(int(x)) if x.is_integer() else repr(x)
+
+
+def _template_amount(text: str, value: Any, currency: Any) -> str:
+    codes = [r"\{\{currency\}\}", "[" + re.escape(_CURRENCY_SYMBOLS) + "]"]
+    if currency:
+        codes.append(r"(?<![A-Za-z])" + re.escape(str(currency)) + r"(?![A-Za-z])")
+    cur = "(?:" + "|".join(codes) + ")"
+    for form, marker in _amount_forms(value):
+        number = r"(?<![\w.,])" + re.escape(form) + r"(?![\w]|[.,]\d)"
+        text = re.sub("(" + cur + r"\s?)" + number, lambda m: m.group(1) + marker, text)
+        text = re.sub(number + r"(\s?" + cur + ")", lambda m: marker + m.group(1), text)
+    return text
+
+
+def _distinctive_id(value: str) -> bool:
+    if value.isdigit():
+        return len(value) >= MIN_NUMERIC_ID_LENGTH
+    return len(value) >= MIN_ID_LENGTH
+
+
+def to_template(text: str, values: Dict[str, Any]) -> Optional[str]:
+    """`text` with transaction values replaced by markers; None if it must not be cached."""
+
+    for field in TEMPLATE_FIELDS:
+        value = values.get(field)
+        if value is None or value == "":
+            continue
+        if field == "amount":
+            text = _template_amount(text, value, values.get("currency"))
+            continue
+        token = re.compile(r"(?<![\w.])" + re.escape(str(value)) + r"(?!\w|\.\d)")
+        if field in ID_FIELDS and not _distinctive_id(str(value)):
+            # cannot tell this id from the same word or number used otherwise
+            if token.search(text):
+                return None
+            continue
+        text = token.sub("{{" + field + "}}", text)
+    return text
+
+
+def fill_template(text: str, values: Dict[str, Any]) -> str:
+    if "{{" not in text:
+        return text
+
+    def fill(m: "re.Match[str]") -> str:
+        field, spec = m.group(1), m.group(2)
+        if field not in TEMPLATE_FIELDS:
+            return m.group(0)
+        value = values.get(field)
+        if value is None:
+            return ""
+        return format_amount(value, spec) if field == "amount" else str(value)
+
+    return _MARKER.sub(fill, text)
+
+
+class WizardCache:
+    """LRU+TTL cache of templated LLM wizard answers with hit/miss counters."""
+
+    def __init__(
+        self,
+        maxsize: int = 10000,
+        ttl: float = 3600.0,
+        key_fields: Sequence[Tuple[str, str]] = (),
+        backend: Optional[CacheBackend] = None,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.key_fields = list(key_fields)
+        self.backend = backend
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.uncacheable = 0
+
+    def fingerprint(self, scoring: Dict[str, Any], tx: Dict[str, Any], model: str = "") -> str:
+        normalized = {
+            "m": model,
+            "r": scoring.get("risk_level"),
+            "a": scoring.get("suggested_action"),
+            "f": sorted(scoring.get("rules_fired") or []),
+            "s": round(float(scoring.get("score") or 0.0), 2),
+            "t": [[f, b, bucket_value(tx.get(f), b)] for f, b in self.key_fields],
+        }
+        raw = json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def _get_local(self, key: str) -> Optional[dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, template = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return template
+
+    def _put_local(self, key: str, template: dict) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, template)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get(self, key: str, values: Dict[str, Any]) -> Optional[Tuple[str, List[dict]]]:
+        """Return filled (reasoning, steps) for `key`, or None on a miss."""
+
+        template = self._get_local(key)
+        if template is None and self.backend is not None:
+            try:
+                raw = await self.backend.get(key)
+            except Exception:
+                raw = None
+            if raw is not None:
+                try:
+                    template = json.loads(raw)
+                    self._put_local(key, template)
+                    self.shared_hits += 1
+                except ValueError:
+                    template = None
+        if template is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        steps = [
+            {
+                **step,
+                "title": fill_template(step["title"], values),
+                "message": fill_template(step["message"], values),
+            }
+            for step in template["wizard_steps"]
+        ]
+        return fill_template(template["reasoning"], values), steps
+
+    async def put(self, key: str, reasoning: str, steps: List[dict], values: Dict[str, Any]) -> None:
+        template = {
+            "reasoning": to_template(reasoning, values),
+            "wizard_steps": [
+                {
+                    **step,
+                    "title": to_template(step["title"], values),
+                    "message": to_template(step["message"], values),
+                }
+                for step in steps
+            ],
+        }
+        if template["reasoning"] is None or any(
+            step["title"] is None or step["message"] is None for step in template["wizard_steps"]
+        ):
+            self.uncacheable += 1
+            return
+        self._put_local(key, template)
+        if self.backend is not None:
+            try:
+                await self.backend.set(key, json.dumps(template, ensure_ascii=False), self.ttl)
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "uncacheable": self.uncacheable,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "shared_backend": type(self.backend).__name__ if self.backend else None,
+        }
@@ -0,0 +1,135 @@
+"""CPU cost of building and encoding the /analyze response, before and after.
+
+Two measurements, both in-process and with no network or database:
+
+  envelope  builds one representative envelope the old way
+            (`AnalysisResult(...).dict()`, FastAPI's `jsonable_encoder`,
+            `json`-based `JSONResponse`) and the current way (`_analysis_data`
+            + `FastJSONResponse`), checks that both give identical bytes,
+            and prints CPU microseconds per envelope for each.
+  analyze   sends `--requests` POST /analyze?llm=false through the ASGI app
+            and prints process CPU time per request. Run it on two checkouts
+            to compare whole-request cost.
+
+Usage (from project root):
+    docker compose run --rm api python scripts/bench_envelope.py envelope
+    docker compose run --rm api python scripts/bench_envelope.py analyze --requests 5000
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from app import main  # noqa: E402
+from app.fastjson import HAS_ORJSON, FastJSONResponse  # noqa: E402
+
+SAMPLE_TX = {
+    "amount": 742.18,
+    "currency": "EUR",
+    "customer_id": "cus-1842",
+    "transaction_id": "tx-bench-1",
+    "merchant": "Kaffeehaus Müller",
+    "merchant_id": "m-77",
+    "channel": "web",
+    "timestamp": "2026-10-17T08:15:00Z",
+    "ip_address": "203.0.113.9",
+    "ip_country": "DE",
+    "device_id": "dev-9",
+    "user_agent": "Mozilla/5.0",
+    "previous_tx_count_24h": 4,
+    "previous_chargebacks_90d": 0,
+}
+
+
+def _inputs():
+    tx = main.TransactionData(**SAMPLE_TX)
+    scoring = main.score_transaction(tx)
+    reasoning, steps = main._fallback_reasoning_and_steps(scoring, tx)
+    explanation = [{"feature": "amount", "importance": 0.123456}, {"feature": "channel", "importance": -0.0421}]
+    return tx, scoring, reasoning, steps, explanation
+
+
+def _old_body(tx, scoring, reasoning, steps, explanation, meta) -> bytes:
+    analysis = main.AnalysisResult(
+        id=None,
+        score=scoring.score,
+        risk_level=scoring.risk_level,
+        reasoning=reasoning,
+        suggested_action=scoring.suggested_action,
+        wizard_steps=steps,
+        explanation=[main.ExplainEntry(**e) for e in explanation],
+    )
+    envelope = {"data": {"transaction": tx.dict(), **analysis.dict()}, "meta": dict(meta), "error": None}
+    return JSONResponse(jsonable_encoder(envelope)).body
+
+
+def _new_body(tx, scoring, reasoning, steps, explanation, meta) -> bytes:
+    envelope = {
+        "data": main._analysis_data(tx.dict(), None, scoring, reasoning, steps, explanation),
+        "meta": dict(meta),
+        "error": None,
+    }
+    return FastJSONResponse(envelope).body
+
+
+def _cpu_us(fn, args, n: int) -> float:
+    fn(*args)
+    started = time.process_time()
+    for _ in range(n):
+        fn(*args)
+    return (time.process_time() - started) / n * 1e6
+
+
+def bench_envelope(n: int) -> None:
+    tx, scoring, reasoning, steps, explanation = _inputs()
+    meta = main._analysis_envelope(tx, scoring, reasoning, steps, False, explanation=explanation)["meta"]
+    meta["timings_ms"] = {"velocity": 0.021, "score": 0.034, "explain": 0.118, "llm": 0.05, "total": 0.412}
+    args = (tx, scoring, reasoning, steps, explanation, meta)
+    old, new = _old_body(*args), _new_body(*args)
+    if old != new:
+        raise SystemExit(f"wire format differs:\n old {old!r}\n new {new!r}")
+    before = _cpu_us(_old_body, args, n)
+    after = _cpu_us(_new_body, args, n)
+    print(f"orjson: {'yes' if HAS_ORJSON else 'no (stdlib json fallback)'}; {len(new)} bytes, identical output")
+    print(f"before: {before:8.1f} us/envelope  (AnalysisResult + .dict() + jsonable_encoder + json)")
+    print(f"after:  {after:8.1f} us/envelope  (_analysis_data + FastJSONResponse)")
+    print(f"saved:  {before - after:8.1f} us ({(before - after) / before:.0%})")
+
+
+async def bench_analyze(n: int) -> None:
+    import httpx
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for _ in range(min(n, 200)):  # warm-up
+            await client.post("/analyze?llm=false", json=SAMPLE_TX)
+        started = time.process_time()
+        for i in range(n):
+            r = await client.post("/analyze?llm=false", json={**SAMPLE_TX, "transaction_id": f"tx-bench-{i}"})
+            r.raise_for_status()
+        cpu = time.process_time() - started
+    print(f"{n} requests: {cpu / n * 1e6:.1f} us CPU per /analyze?llm=false (client included)")
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("envelope")
+    p.add_argument("--iterations", type=int, default=20000)
+    p = sub.add_parser("analyze")
+    p.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    if args.cmd == "envelope":
+        bench_envelope(args.iterations)
+    else:
+        asyncio.run(bench_analyze(args.requests))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,47 @@
+"""Build a memory-mappable IP intelligence index from a CIDR/country/ASN CSV.
+
+The CSV has `network,country,asn,as_org` columns (header optional, `asn`
+may be `13335` or `AS13335`). Nested networks are fine; the most specific
+one wins. The output directory is what IP_INTEL_PATH points at (layout in
+app/ipintel.py):
+
+    docker compose run --rm api python scripts/build_ipintel.py data/ip.csv data/ipintel --version 2026-10-17
+
+Rebuilding into the directory the API is serving is safe: every file is
+replaced by rename, so a running process keeps reading the old index until
+it reloads (POST /ipintel/reload, or IP_INTEL_WATCH_INTERVAL).
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ipintel import IPIndex, build_arrays, read_csv, save_index  # noqa: E402
+
+
+def run() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('csv', help='network,country,asn,as_org CSV')
+    parser.add_argument('out', help='index directory to write')
+    parser.add_argument('--version', help='index version (default: CSV modification date)')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    arrays = build_arrays(read_csv(args.csv))
+    version = args.version or time.strftime('%Y-%m-%d', time.gmtime(os.path.getmtime(args.csv)))
+    save_index(arrays, args.out, version)
+    built = time.perf_counter() - started
+
+    started = time.perf_counter()
+    index = IPIndex.load(args.out)
+    loaded = time.perf_counter() - started
+    ranges = index.ranges()
+    print(f"{args.out}: version {version}, {arrays['networks']} networks -> "
+          f"{ranges['v4']} IPv4 + {ranges['v6']} IPv6 ranges, {len(index.rec_asn)} records "
+          f"(built in {built:.2f}s, loads in {loaded * 1000:.1f} ms)")
+
+
+if __name__ == '__main__':
+    run()
@@ -1,35 +1,340 @@
-"""Test simulator (inside api container) - posts random transactions to /analyze endpoint inside Docker network
+"""Load generator and latency benchmark for the Fraud Wizard API.
 
-Usage (from repo root):
-  docker compose run --rm -e API_URL=http://api:8000/analyze api python scripts/test_simulator.py
+Open-loop: requests are fired on a fixed arrival schedule (uniform or
+Poisson) at `--rate` per second, independent of how fast the API answers.
+Latency is measured from the *scheduled* send time. A slow server
+therefore shows up as latency and is not hidden by a client that slows
+down with it (coordinated omission). When `--concurrency` requests are
+already in flight, new arrivals are counted as `dropped` instead of
+queued.
+
+Scenarios (mix them with --mix):
+  analyze        POST /analyze
+  analyze-nollm  POST /analyze?llm=false (scoring + persistence only)
+  alerts         GET  /alerts?limit=50
+
+Usage (from repo root, API on localhost):
+  python backend/scripts/test_simulator.py run --rate 50 --duration 30 --out base.json
+  python backend/scripts/test_simulator.py run --mix analyze-nollm=0.8,alerts=0.2 --out new.json
+  python backend/scripts/test_simulator.py compare base.json new.json --threshold 10
+
+Inside the api container:
+  docker compose run --rm -e API_URL=http://api:8000 api python scripts/test_simulator.py run
 """
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+import argparse
+import asyncio
+import json
 import os
 import random
-import requests
+import sys
+import time
+
+import httpx
 from faker import Faker
 
-fake = Faker()
-API = os.environ.get('API_URL') or 'http://api:8000/analyze'
-
-transactions = []
-for i in range(10):
-    amount = random.choice([random.uniform(1, 1000), random.uniform(1000, 6000), random.uniform(10000, 20000)])
-    tx = {
-        'amount': round(amount, 2),
-        'currency': random.choice(['USD','EUR','TRY']),
-        'merchant': fake.company(),
-        'timestamp': fake.iso8601(),
-        'ip_address': random.choice([fake.ipv4_private(), fake.ipv4_public(), '192.168.1.' + str(random.randint(2,200))]),
-        'customer_id': fake.uuid4()
+DEFAULT_API = os.environ.get('API_URL') or 'http://api:8000'
+
+SCENARIOS = {
+    'analyze': ('POST', '/analyze'),
+    'analyze-nollm': ('POST', '/analyze?llm=false'),
+    'alerts': ('GET', '/alerts?limit=50'),
+}
+
+# histogram bucket upper bounds in milliseconds (last bucket is +Inf)
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000]
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    out = {}
+    for part in spec.split(','):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f'unknown scenario {name!r}; choose from {", ".join(SCENARIOS)}')
+        out[name] = float(weight or 1)
+    return out
+
+
+class TrafficMix:
+    """Random transactions with configurable amount bands, IP types and repeat customers."""
+
+    def __init__(self, amount_bands: Dict[str, float], ip_mix: Dict[str, float], repeat_ratio: float, customers: int, seed: Optional[int]):
+        self.rng = random.Random(seed)
+        self.fake = Faker()
+        if seed is not None:
+            Faker.seed(seed)
+        self.amount_bands = [(tuple(float(x) for x in band.split('-')), w) for band, w in amount_bands.items()]
+        self.ip_mix = list(ip_mix.items())
+        self.repeat_ratio = repeat_ratio
+        self.customers = [self.fake.uuid4() for _ in range(customers)]
+        self.merchants = [self.fake.company() for _ in range(50)]
+
+    def _pick(self, weighted):
+        return self.rng.choices([k for k, _ in weighted], weights=[w for _, w in weighted])[0]
+
+    def _uuid(self) -> str:
+        # cheaper than Faker per request, so the generator is not the bottleneck
+        return '%032x' % self.rng.getrandbits(128)
+
+    def _ip(self) -> str:
+        kind = self._pick(self.ip_mix)
+        r = self.rng.randint
+        if kind == 'private':
+            return f'10.{r(0, 255)}.{r(0, 255)}.{r(1, 254)}'
+        if kind == 'local192':
+            return '192.168.1.' + str(r(2, 200))
+        return f'{r(11, 99)}.{r(0, 255)}.{r(0, 255)}.{r(1, 254)}'
+
+    def transaction(self) -> dict:
+        lo, hi = self._pick(self.amount_bands)
+        customer = self.rng.choice(self.customers) if self.rng.random() < self.repeat_ratio else self._uuid()
+        return {
+            'amount': round(self.rng.uniform(lo, hi), 2),
+            'currency': self.rng.choice(['USD', 'EUR', 'TRY']),
+            'merchant': self.rng.choice(self.merchants),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'ip_address': self._ip(),
+            'customer_id': customer,
+            'transaction_id': 'bench-' + self._uuid()[:12],
+        }
+
+
+class ScenarioStats:
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.ok = 0
+        self.errors = 0
+        self.dropped = 0
+        self.status_codes: Dict[str, int] = {}
+
+    def summary(self, elapsed: float) -> dict:
+        lat = sorted(self.latencies_ms)
+
+        def pct(p: float) -> Optional[float]:
+            if not lat:
+                return None
+            return round(lat[min(len(lat) - 1, int(round(p / 100.0 * (len(lat) - 1))))], 3)
+
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for v in lat:
+            for i, bound in enumerate(BUCKETS_MS):
+                if v <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+        histogram = {f'le_{b}': c for b, c in zip(BUCKETS_MS, counts)}
+        histogram['le_inf'] = counts[-1]
+
+        sent = self.ok + self.errors
+        return {
+            'requests': sent,
+            'ok': self.ok,
+            'errors': self.errors,
+            'dropped': self.dropped,
+            'error_rate': round(self.errors / sent, 5) if sent else 0.0,
+            'throughput_rps': round(self.ok / elapsed, 2) if elapsed else 0.0,
+            'latency_ms': {
+                'p50': pct(50),
+                'p95': pct(95),
+                'p99': pct(99),
+                'max': round(lat[-1], 3) if lat else None,
+                'mean': round(sum(lat) / len(lat), 3) if lat else None,
+            },
+            'histogram_ms': histogram,
+            'status_codes': self.status_codes,
+        }
+
+
+async def run_load(args) -> dict:
+    mix = parse_weights(args.mix)
+    traffic = TrafficMix(
+        amount_bands=parse_band_weights(args.amount_bands),
+        ip_mix=parse_band_weights(args.ip_mix),
+        repeat_ratio=args.repeat_ratio,
+        customers=args.customers,
+        seed=args.seed,
+    )
+    stats = {name: ScenarioStats() for name in mix}
+    names, weights = list(mix), list(mix.values())
+    base = args.base_url.rstrip('/')
+    if base.endswith('/analyze'):
+        base = base[: -len('/analyze')]
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    in_flight = 0
+    tasks = set()
+
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=args.timeout) as client:
+
+        async def fire(name: str, scheduled: float):
+            nonlocal in_flight
+            method, path = SCENARIOS[name]
+            st = stats[name]
+            try:
+                if method == 'POST':
+                    resp = await client.post(path, json=traffic.transaction())
+                else:
+                    resp = await client.get(path)
+                code = str(resp.status_code)
+                ok = resp.status_code < 400
+                if ok and name.startswith('analyze'):
+                    # the API reports hard failures inside the envelope too
+                    ok = resp.json().get('error') is None
+                if args.verbose:
+                    print(name, code, resp.text[:200])
+            except Exception as e:
+                code, ok = type(e).__name__, False
+            finally:
+                in_flight -= 1
+            st.status_codes[code] = st.status_codes.get(code, 0) + 1
+            if ok:
+                st.ok += 1
+                st.latencies_ms.append((time.perf_counter() - scheduled) * 1000.0)
+            else:
+                st.errors += 1
+
+        loop_start = time.perf_counter()
+        next_at = loop_start
+        rng = random.Random(args.seed)
+        while next_at - loop_start < args.duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            name = rng.choices(names, weights=weights)[0] if len(names) > 1 else names[0]
+            if in_flight >= args.concurrency:
+                stats[name].dropped += 1
+            else:
+                in_flight += 1
+                task = asyncio.create_task(fire(name, next_at))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            gap = rng.expovariate(args.rate) if args.arrival == 'poisson' else 1.0 / args.rate
+            next_at += gap
+        if tasks:
+            await asyncio.wait(tasks)
+        elapsed = time.perf_counter() - loop_start
+
+    scenarios = {name: st.summary(elapsed) for name, st in stats.items()}
+    return {
+        'tool': 'fraud-wizard-bench-1',
+        'started_at': datetime.now(timezone.utc).isoformat(),
+        'config': {
+            'base_url': base,
+            'rate': args.rate,
+            'duration': args.duration,
+            'concurrency': args.concurrency,
+            'arrival': args.arrival,
+            'mix': mix,
+            'amount_bands': args.amount_bands,
+            'ip_mix': args.ip_mix,
+            'repeat_ratio': args.repeat_ratio,
+        },
+        'elapsed_s': round(elapsed, 3),
+        'scenarios': scenarios,
     }
-    transactions.append(tx)
 
-for tx in transactions:
-    print('POST ->', tx)
-    try:
-        res = requests.post(API, json=tx, timeout=5)
-        print('  =>', res.status_code, res.text)
-    except Exception as e:
-        print('  ERROR:', e)
 
-print('Done')
+def parse_band_weights(spec: str) -> Dict[str, float]:
+    out = {}
+    for part in spec.split(','):
+        if part.strip():
+            key, _, weight = part.partition('=')
+            out[key.strip()] = float(weight or 1)
+    return out
+
+
+def print_report(result: dict) -> None:
+    print(f"elapsed {result['elapsed_s']}s  target rate {result['config']['rate']}/s")
+    for name, s in result['scenarios'].items():
+        lat = s['latency_ms']
+        print(
+            f"{name:14s} ok={s['ok']:<7d} err={s['errors']:<5d} drop={s['dropped']:<5d} "
+            f"rps={s['throughput_rps']:<8} p50={lat['p50']} p95={lat['p95']} p99={lat['p99']} max={lat['max']} ms"
+        )
+
+
+def compare(base: dict, new: dict, threshold_pct: float) -> int:
+    """Print deltas between two result files; return 1 on regression."""
+
+    regressions = []
+    for name, b in base['scenarios'].items():
+        n = new['scenarios'].get(name)
+        if n is None:
+            print(f'{name}: missing from new run')
+            continue
+        print(f'== {name}')
+        for key in ('p50', 'p95', 'p99', 'max'):
+            bv, nv = b['latency_ms'][key], n['latency_ms'][key]
+            if bv is None or nv is None:
+                continue
+            delta = (nv - bv) / bv * 100.0 if bv else 0.0
+            print(f'  {key:4s} {bv:10.3f} -> {nv:10.3f} ms ({delta:+.1f}%)')
+            if key in ('p95', 'p99') and delta > threshold_pct:
+                regressions.append(f'{name} {key} +{delta:.1f}%')
+        bt, nt = b['throughput_rps'], n['throughput_rps']
+        delta = (nt - bt) / bt * 100.0 if bt else 0.0
+        print(f'  rps  {bt:10.2f} -> {nt:10.2f}    ({delta:+.1f}%)')
+        if delta < -threshold_pct:
+            regressions.append(f'{name} throughput {delta:.1f}%')
+        be, ne = b['error_rate'], n['error_rate']
+        print(f'  err  {be:10.5f} -> {ne:10.5f}')
+        if ne - be > 0.01:
+            regressions.append(f'{name} error rate +{(ne - be) * 100:.2f}pp')
+
+    if regressions:
+        print('REGRESSIONS: ' + '; '.join(regressions))
+        return 1
+    print('no regressions beyond threshold')
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='cmd')
+
+    run = sub.add_parser('run', help='generate load and record latencies')
+    run.add_argument('--base-url', default=DEFAULT_API)
+    run.add_argument('--rate', type=float, default=10.0, help='arrivals per second')
+    run.add_argument('--duration', type=float, default=10.0, help='seconds of load')
+    run.add_argument('--concurrency', type=int, default=64, help='max requests in flight')
+    run.add_argument('--arrival', choices=['uniform', 'poisson'], default='poisson')
+    run.add_argument('--mix', default='analyze=1', help='scenario weights, e.g. analyze=0.7,alerts=0.3')
+    run.add_argument('--amount-bands', default='1-1000=1,1000-6000=1,10000-20000=1', help='lo-hi=weight,...')
+    run.add_argument('--ip-mix', default='private=1,public=1,local192=1', help='private/public/local192 weights')
+    run.add_argument('--repeat-ratio', type=float, default=0.3, help='share of transactions from repeat customers')
+    run.add_argument('--customers', type=int, default=100, help='size of the repeat-customer pool')
+    run.add_argument('--timeout', type=float, default=30.0)
+    run.add_argument('--seed', type=int, default=None)
+    run.add_argument('--out', help='write the JSON result here')
+    run.add_argument('--verbose', action='store_true', help='print every response (old simulator behaviour)')
+
+    cmp_ = sub.add_parser('compare', help='compare two result files')
+    cmp_.add_argument('base')
+    cmp_.add_argument('new')
+    cmp_.add_argument('--threshold', type=float, default=10.0, help='allowed regression in percent')
+
+    args = parser.parse_args(argv if argv is not None else (sys.argv[1:] or ['run']))
+
+    if args.cmd == 'compare':
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        return compare(base, new, args.threshold)
+
+    result = asyncio.run(run_load(args))
+    print_report(result)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(result, f, indent=2)
+        print('wrote', args.out)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
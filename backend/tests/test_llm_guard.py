@@ -0,0 +1,70 @@
+import asyncio
+
+from app import main
+from app.llm_guard import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _half_open_breaker(clock, probes=1):
+    breaker = CircuitBreaker(
+        min_calls=1, open_seconds=5.0, half_open_probes=probes, half_open_seconds=10.0, clock=clock
+    )
+    breaker.allow()
+    breaker.record(False, 0.1)
+    assert breaker.state == OPEN
+    clock.now += 5.0
+    return breaker
+
+
+def test_cancelled_probe_frees_its_slot(monkeypatch):
+    clock = FakeClock()
+    breaker = _half_open_breaker(clock)
+    monkeypatch.setattr(main, "LLM_BREAKER", breaker)
+    monkeypatch.setattr(main, "_microbatcher_for", lambda model: None)
+
+    started = asyncio.Event()
+
+    async def hang(jobs):
+        started.set()
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(main, "_complete_wizard_batch", hang)
+
+    async def run():
+        task = asyncio.create_task(main._call_llm_admitted(None, None, {}, None, None, "m"))
+        await started.wait()
+        assert breaker.state == HALF_OPEN
+        assert not breaker.allow()  # the single probe slot is taken
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()  # slot was given back
+    breaker.record(True, 0.1)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_without_verdict_reopens():
+    clock = FakeClock()
+    breaker = _half_open_breaker(clock)
+    assert breaker.allow()  # probe goes out and never reports back
+    assert not breaker.allow()
+
+    clock.now += 10.0
+    assert not breaker.allow()
+    assert breaker.state == OPEN
+
+    clock.now += 5.0
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
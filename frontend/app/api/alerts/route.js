@@ -1,6 +1,9 @@
 import { NextResponse } from 'next/server'
 
-export async function GET() {
+export async function GET(request) {
+  // forward filters / cursor (e.g. ?action=BLOCK&cursor=...) to the backend
+  const { search } = new URL(request.url)
+
   // Robust proxy: try multiple candidate backends (useful for dev inside or outside Docker)
   const candidates = []
   if (process.env.NEXT_PUBLIC_BACKEND_URL) candidates.push(process.env.NEXT_PUBLIC_BACKEND_URL.replace(/\/$/, ''))
@@ -17,7 +20,7 @@ export async function GET() {
 
   for (const base of candidates) {
     if (!base) continue
-    const url = `${base}/alerts`
+    const url = `${base}/alerts${search}`
     tried.push(url)
     try {
       const res = await fetchWithTimeout(url, { cache: 'no-store' }, 5000)
@@ -27,7 +30,10 @@ export async function GET() {
         continue
       }
       const json = await res.json()
-      return NextResponse.json(json)
+      const headers = {}
+      const nextCursor = res.headers.get('x-next-cursor')
+      if (nextCursor) headers['X-Next-Cursor'] = nextCursor
+      return NextResponse.json(json, { headers })
     } catch (err) {
       console.error(`proxy call to ${url} failed:`, err?.message || err)
       // continue to next candidate
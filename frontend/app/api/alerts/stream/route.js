@@ -0,0 +1,39 @@
+// long-lived Server-Sent Events proxy: never cache, never pre-render
+export const dynamic = 'force-dynamic'
+
+export async function GET(request) {
+  // forward filters (e.g. ?action=BLOCK) and the resume cursor to the backend
+  const { search } = new URL(request.url)
+  const headers = { Accept: 'text/event-stream' }
+  const lastEventId = request.headers.get('last-event-id')
+  if (lastEventId) headers['Last-Event-ID'] = lastEventId
+
+  const candidates = []
+  if (process.env.NEXT_PUBLIC_BACKEND_URL) candidates.push(process.env.NEXT_PUBLIC_BACKEND_URL.replace(/\/$/, ''))
+  candidates.push('http://api:8000') // typical container internal name
+  candidates.push('http://localhost:8000') // fallback for host dev
+
+  for (const base of candidates) {
+    if (!base) continue
+    const url = `${base}/alerts/stream${search}`
+    try {
+      // abort the upstream stream when the browser goes away
+      const res = await fetch(url, { headers, cache: 'no-store', signal: request.signal })
+      if (!res.ok || !res.body) {
+        console.error(`stream proxy to ${url} returned status ${res.status}`)
+        continue
+      }
+      return new Response(res.body, {
+        headers: {
+          'Content-Type': 'text/event-stream',
+          'Cache-Control': 'no-cache, no-transform',
+          Connection: 'keep-alive',
+        },
+      })
+    } catch (err) {
+      console.error(`stream proxy to ${url} failed:`, err?.message || err)
+    }
+  }
+
+  return new Response('stream unavailable', { status: 502 })
+}
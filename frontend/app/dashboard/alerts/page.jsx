@@ -1,6 +1,6 @@
 "use client"
 
-import { useState } from 'react'
+import { useEffect, useState } from 'react'
 import useSWR from 'swr'
 
 const fetcher = (url) => fetch(url).then(r => r.json())
@@ -13,12 +13,40 @@ function colorForAction(action) {
 }
 
 export default function AlertsPage() {
-  const { data, error, mutate } = useSWR('/api/alerts', fetcher)
-
-  const blocked = (data || []).filter(d => d.suggested_action === 'BLOCK').length
-  const review = (data || []).filter(d => d.suggested_action === 'REVIEW').length
-  const allow = (data || []).filter(d => d.suggested_action === 'ALLOW').length
   const [filter, setFilter] = useState('ALL')
+  // action filter runs server-side so the page is not limited to the latest 50 mixed rows
+  const query = filter === 'ALL' ? '' : `?action=${filter}`
+  // new alerts are pushed over /api/alerts/stream, so no focus revalidation is needed
+  const { data, error, mutate } = useSWR(`/api/alerts${query}`, fetcher, { revalidateOnFocus: false })
+
+  // counters cover the last 24h server-side (rollups), not just the rows loaded here
+  const { data: stats, mutate: mutateStats } = useSWR('/api/alerts/stats', fetcher, { refreshInterval: 60000 })
+  const byAction = stats?.by_action || {}
+  const blocked = byAction.BLOCK || 0
+  const review = byAction.REVIEW || 0
+  const allow = byAction.ALLOW || 0
+
+  useEffect(() => {
+    const source = new EventSource(`/api/alerts/stream${query}`)
+    // (re)connected: refetch the page to close any gap, then follow the stream
+    source.onopen = () => mutate()
+    source.addEventListener('alert', (e) => {
+      const alert = JSON.parse(e.data)
+      mutateStats((st) => st && st.by_action ? {
+        ...st,
+        total: (st.total || 0) + 1,
+        by_action: { ...st.by_action, [alert.suggested_action]: (st.by_action[alert.suggested_action] || 0) + 1 },
+      } : st, false)
+      mutate((rows) => {
+        if (!Array.isArray(rows)) return rows
+        if (rows.some(r => r.id === alert.id)) return rows
+        return [alert, ...rows].slice(0, Math.max(rows.length, 50))
+      }, false)
+    })
+    // the server could not replay what we missed: reload the list
+    source.addEventListener('resync', () => { mutate(); mutateStats() })
+    return () => source.close()
+  }, [query, mutate, mutateStats])
 
   return (
     <div className="max-w-5xl mx-auto py-8">
@@ -39,7 +67,7 @@ export default function AlertsPage() {
             <option value="REVIEW">REVIEW</option>
             <option value="ALLOW">ALLOW</option>
           </select>
-          <button onClick={() => mutate()} className="px-3 py-2 rounded bg-indigo-600 text-white text-sm">Refresh</button>
+          <button onClick={() => { mutate(); mutateStats() }} className="px-3 py-2 rounded bg-indigo-600 text-white text-sm">Refresh</button>
           <button onClick={() => downloadCSV(data)} className="px-3 py-2 rounded bg-gray-700 text-white text-sm">Download CSV</button>
           <a href="http://localhost:8080" target="_blank" rel="noreferrer" className="px-3 py-2 rounded border text-sm">Open Adminer</a>
         </div>
@@ -68,8 +96,8 @@ export default function AlertsPage() {
               </tr>
             </thead>
             <tbody>
-              {data.filter(r => filter === 'ALL' ? true : r.suggested_action === filter).map((row, idx) => (
-                <tr key={row.transaction_id || idx} className={`border-b ${colorForAction(row.suggested_action)} border-l-4`}>
+              {data.map((row, idx) => (
+                <tr key={row.id || row.transaction_id || idx} className={`border-b ${colorForAction(row.suggested_action)} border-l-4`}>
                   <td className="p-3 font-medium">{row.transaction_id || '—'}</td>
                   <td className="p-3 font-semibold">{Number(row.risk_score || 0).toFixed(2)}</td>
                   <td className="p-3 text-slate-700 max-w-xl truncate">{row.ai_reason || '—'}</td>
@@ -1,38 +1,20 @@
-"""Simple test simulator that posts random transactions to POST /analyze
+"""Load generator / latency benchmark for POST /analyze (host wrapper)
 
 Usage:
-    python test_simulator.py
+    python test_simulator.py                      # short run against http://localhost:8000
+    python test_simulator.py run --rate 100 --duration 60 --out base.json
+    python test_simulator.py compare base.json new.json
 
-Ensure your API is running at http://localhost:8000
+Ensure your API is running at http://localhost:8000 (or set API_URL).
+The implementation lives in backend/scripts/test_simulator.py; see its
+docstring for all options.
 """
-import random
-import requests
-from faker import Faker
-
-fake = Faker()
 import os
+import runpy
+import sys
 
-API = os.environ.get('API_URL') or 'http://localhost:8000/analyze'
-
-transactions = []
-for i in range(10):
-    amount = random.choice([random.uniform(1, 1000), random.uniform(1000, 6000), random.uniform(10000, 20000)])
-    tx = {
-        'amount': round(amount, 2),
-        'currency': random.choice(['USD','EUR','TRY']),
-        'merchant': fake.company(),
-        'timestamp': fake.iso8601(),
-        'ip_address': random.choice([fake.ipv4_private(), fake.ipv4_public(), '192.168.1.' + str(random.randint(2,200))]),
-        'customer_id': fake.uuid4()
-    }
-    transactions.append(tx)
-
-for tx in transactions:
-    print('POST ->', tx)
-    try:
-        res = requests.post(API, json=tx, timeout=5)
-        print('  =>', res.status_code, res.text)
-    except Exception as e:
-        print('  ERROR:', e)
+os.environ.setdefault('API_URL', 'http://localhost:8000')
 
-print('Done')
+if __name__ == '__main__':
+    sys.argv[0] = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend', 'scripts', 'test_simulator.py')
+    runpy.run_path(sys.argv[0], run_name='__main__')